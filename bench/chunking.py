@@ -0,0 +1,96 @@
+"""
+Benchmark tahap parse & chunk pada korpus sintetis N× ukuran ./data.
+
+    python -m bench.chunking --scale 100 --workers 1 4 8
+"""
+import argparse
+import glob
+import os
+import shutil
+import tempfile
+import time
+
+# Hanya untuk baseline pipeline lama; paket `markdown` tidak ada di requirements.txt
+try:
+    import markdown
+    HAS_MARKDOWN = True
+except ImportError:
+    HAS_MARKDOWN = False
+
+from rag.chunking import iter_parsed_files
+
+
+def markdown_to_text_legacy(md_text):
+    # Pipeline lama: Markdown -> HTML -> replace tag <p>, sebagai pembanding
+    html = markdown.markdown(md_text)
+    return html.replace("<p>", "").replace("</p>", "\n")
+
+
+def chunk_text_naive(text, max_tokens=300):
+    # chunk_text versi lama (concat string + split ulang), sebagai pembanding
+    paragraphs = text.split("\n\n")
+    chunks, current_chunk = [], ""
+    for para in paragraphs:
+        if len(current_chunk.split()) + len(para.split()) <= max_tokens:
+            current_chunk += para + "\n\n"
+        else:
+            chunks.append(current_chunk.strip())
+            current_chunk = para + "\n\n"
+    if current_chunk:
+        chunks.append(current_chunk.strip())
+    return chunks
+
+
+def build_corpus(source_dir, target_dir, scale):
+    sources = glob.glob(os.path.join(source_dir, "**", "*.md"), recursive=True)
+    files = []
+    for copy in range(scale):
+        for i, path in enumerate(sources):
+            target = os.path.join(target_dir, f"{copy:04d}_{i:03d}.md")
+            shutil.copyfile(path, target)
+            files.append(target)
+    return files
+
+
+def run(files, workers):
+    start = time.perf_counter()
+    n_chunks = sum(len(chunks) for _, _, _, chunks in iter_parsed_files(files, workers))
+    return time.perf_counter() - start, n_chunks
+
+
+def run_naive(files):
+    start = time.perf_counter()
+    n_chunks = 0
+    for path in files:
+        with open(path, "r", encoding="utf-8") as f:
+            n_chunks += len(chunk_text_naive(markdown_to_text_legacy(f.read())))
+    return time.perf_counter() - start, n_chunks
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark parse & chunk Markdown")
+    parser.add_argument("--data", default="./data")
+    parser.add_argument("--scale", type=int, default=100)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count() or 1])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        files = build_corpus(args.data, tmp, args.scale)
+        size_mb = sum(os.path.getsize(f) for f in files) / 1e6
+        print(f"Korpus: {len(files)} file, {size_mb:.1f} MB ({args.scale}× {args.data})")
+
+        rows = []
+        if HAS_MARKDOWN:
+            rows.append(("legacy (serial)", *run_naive(files)))
+        else:
+            print("⚠️ Paket `markdown` tidak terpasang; baseline legacy dilewati (pip install markdown)")
+        for workers in args.workers:
+            rows.append((f"workers={workers}", *run(files, workers)))
+
+        print(f"{'mode':<16}{'detik':>10}{'file/s':>12}{'chunk/s':>12}{'chunks':>10}")
+        for label, seconds, n_chunks in rows:
+            print(f"{label:<16}{seconds:>10.2f}{len(files) / seconds:>12.0f}{n_chunks / seconds:>12.0f}{n_chunks:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""
+Benchmark kuantisasi vektor: recall@k terhadap exact search, perkiraan
+memori, dan latensi p95 untuk setiap konfigurasi (lihat rag/quantization.py).
+
+Default-nya simulasi NumPy (tanpa server), cukup untuk recall & memori:
+    python -m bench.quantization --n 50000 --k 5 10
+
+Latensi yang representatif diukur di server Qdrant lokal, mis.
+`docker run -p 6333:6333 qdrant/qdrant`:
+    python -m bench.quantization --qdrant-url http://localhost:6333 --n 50000
+"""
+import argparse
+import time
+import uuid
+
+import numpy as np
+
+from rag.quantization import QUANTIZATION_MODES
+
+HNSW_M = 16
+# Bobot tabel popcount untuk jarak Hamming pada vektor biner yang di-pack
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def normalize(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32)
+
+
+def synthetic_corpus(n, dim, n_queries, seed=0):
+    """Vektor berkelompok (mirip embedding teks yang tidak isotropik) + query di sekitar korpus."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(8, n // 500), dim))
+    corpus = centers[rng.integers(len(centers), size=n)] + 0.6 * rng.normal(size=(n, dim))
+    queries = corpus[rng.integers(n, size=n_queries)] + 0.4 * rng.normal(size=(n_queries, dim))
+    return normalize(corpus), normalize(queries)
+
+
+def memory_estimate(n, dim, mode, on_disk):
+    """(RAM, disk) dalam byte seperti perhitungan sizing Qdrant: vektor asli, terkuantisasi, graf HNSW."""
+    original = n * dim * 4
+    quantized = {"none": 0, "scalar": n * dim, "binary": n * ((dim + 7) // 8)}[mode]
+    graph = int(n * HNSW_M * 2 * 4 * 1.1)
+    ram = quantized + graph + (0 if on_disk else original)
+    disk = original + quantized + graph
+    return ram, disk
+
+
+def exact_top_k(corpus, queries, k):
+    scores = queries @ corpus.T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def recall_at_k(found, truth, k):
+    return float(np.mean([len(set(f[:k]) & set(t[:k])) / k for f, t in zip(found, truth)]))
+
+
+class SimulatedIndex:
+    """Pencarian brute-force NumPy dengan kuantisasi scalar int8 / biner ala Qdrant."""
+
+    def __init__(self, corpus, mode):
+        self.corpus = corpus
+        self.mode = mode
+        if mode == "scalar":
+            lo, hi = np.quantile(corpus, [0.005, 0.995])
+            self.codes = np.clip(np.rint((corpus - lo) / (hi - lo) * 255), 0, 255).astype(np.float32)
+        elif mode == "binary":
+            self.codes = np.packbits(corpus > 0, axis=1)
+
+    def _approx_scores(self, query):
+        if self.mode == "scalar":
+            return self.codes @ query
+        if self.mode == "binary":
+            bits = np.packbits(query > 0)
+            return -_POPCOUNT[np.bitwise_xor(self.codes, bits)].sum(axis=1, dtype=np.int32)
+        return self.corpus @ query
+
+    def search(self, query, limit, rescore=True, oversampling=2.0):
+        scores = self._approx_scores(query)
+        n_candidates = min(len(scores), int(limit * oversampling) if rescore and self.mode != "none" else limit)
+        candidates = np.argpartition(-scores, n_candidates - 1)[:n_candidates]
+        if rescore and self.mode != "none":
+            exact = self.corpus[candidates] @ query
+            return candidates[np.argsort(-exact)][:limit]
+        return candidates[np.argsort(-scores[candidates])][:limit]
+
+
+def run_simulated(corpus, queries, configs, ks):
+    rows = []
+    for mode, rescore, oversampling in configs:
+        index = SimulatedIndex(corpus, mode)
+        found, latencies = [], []
+        for q in queries:
+            start = time.perf_counter()
+            found.append(index.search(q, max(ks), rescore, oversampling))
+            latencies.append(time.perf_counter() - start)
+        rows.append((mode, rescore, oversampling, found, latencies))
+    return rows
+
+
+def run_qdrant(url, corpus, queries, configs, ks, batch_size=256):
+    from qdrant_client import QdrantClient
+    from qdrant_client.models import Distance, PointStruct, VectorParams
+
+    from rag.quantization import quantization_config, search_params
+
+    client = QdrantClient(url=url, timeout=300)
+    rows = []
+    collections = {}
+    try:
+        for mode in dict.fromkeys(mode for mode, _, _ in configs):
+            name = f"bench_quant_{mode}_{uuid.uuid4().hex[:8]}"
+            client.create_collection(
+                collection_name=name,
+                vectors_config=VectorParams(size=corpus.shape[1], distance=Distance.COSINE),
+                quantization_config=quantization_config(mode),
+            )
+            for start in range(0, len(corpus), batch_size):
+                client.upsert(
+                    collection_name=name,
+                    points=[
+                        PointStruct(id=start + i, vector=v.tolist())
+                        for i, v in enumerate(corpus[start:start + batch_size])
+                    ],
+                    wait=True,
+                )
+            while client.get_collection(name).status.value != "green":
+                time.sleep(1)
+            collections[mode] = name
+            print(f"   koleksi {name} siap ({len(corpus)} vektor)")
+
+        for mode, rescore, oversampling in configs:
+            params = search_params(mode, rescore, oversampling, hnsw_ef=None)
+            found, latencies = [], []
+            for q in queries:
+                start = time.perf_counter()
+                hits = client.search(
+                    collection_name=collections[mode], query_vector=q.tolist(),
+                    limit=max(ks), search_params=params,
+                )
+                latencies.append(time.perf_counter() - start)
+                found.append([hit.id for hit in hits])
+            rows.append((mode, rescore, oversampling, found, latencies))
+    finally:
+        for name in collections.values():
+            client.delete_collection(collection_name=name)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark kuantisasi vektor (recall, memori, latensi)")
+    parser.add_argument("--n", type=int, default=50000, help="Jumlah vektor korpus sintetis")
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--vectors", help="Pakai matriks .npy (mis. index/vectors.npy) alih-alih korpus sintetis")
+    parser.add_argument("--k", type=int, nargs="+", default=[5, 10])
+    parser.add_argument("--oversampling", type=float, nargs="+", default=[2.0, 4.0])
+    parser.add_argument("--qdrant-url", help="Ukur di server Qdrant (koleksi sementara dibuat & dihapus)")
+    args = parser.parse_args()
+
+    if args.vectors:
+        corpus = normalize(np.load(args.vectors).astype(np.float32))
+        rng = np.random.default_rng(0)
+        queries = normalize(corpus[rng.integers(len(corpus), size=args.queries)]
+                            + 0.4 * rng.normal(size=(args.queries, corpus.shape[1])) / np.sqrt(corpus.shape[1]))
+    else:
+        corpus, queries = synthetic_corpus(args.n, args.dim, args.queries)
+    n, dim = corpus.shape
+    truth = exact_top_k(corpus, queries, max(args.k))
+
+    configs = [("none", False, 1.0)]
+    for mode in QUANTIZATION_MODES[1:]:
+        configs.append((mode, False, 1.0))
+        configs.extend((mode, True, o) for o in args.oversampling)
+
+    where = args.qdrant_url or "simulasi NumPy"
+    print(f"Korpus: {n} vektor × {dim} dim, {len(queries)} query ({where})")
+    if args.qdrant_url:
+        rows = run_qdrant(args.qdrant_url, corpus, queries, configs, args.k)
+    else:
+        rows = run_simulated(corpus, queries, configs, args.k)
+
+    recall_cols = "".join(f"{f'R@{k}':>8}" for k in args.k)
+    print(f"{'konfigurasi':<22}{recall_cols}{'p50 ms':>9}{'p95 ms':>9}"
+          f"{'RAM MB':>9}{'RAM MB*':>9}{'disk MB':>9}")
+    for mode, rescore, oversampling, found, latencies in rows:
+        label = mode if mode == "none" else f"{mode}{f' rescore x{oversampling:g}' if rescore else ''}"
+        recalls = "".join(f"{recall_at_k(found, truth, k):>8.3f}" for k in args.k)
+        p50, p95 = np.percentile(np.asarray(latencies) * 1000, [50, 95])
+        ram, disk = memory_estimate(n, dim, mode, on_disk=False)
+        ram_on_disk, _ = memory_estimate(n, dim, mode, on_disk=True)
+        print(f"{label:<22}{recalls}{p50:>9.2f}{p95:>9.2f}"
+              f"{ram / 1e6:>9.1f}{ram_on_disk / 1e6:>9.1f}{disk / 1e6:>9.1f}")
+    print("* RAM bila vektor asli disimpan on-disk (RAG_VECTORS_ON_DISK=true); rescore lalu membaca dari disk.")
+
+
+if __name__ == "__main__":
+    main()
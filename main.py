@@ -1,33 +1,96 @@
 # filepath: /home/firdaus/Documents/Projects/iNara-AI/livekit/main.py
 from livekit import agents
-from livekit.agents import AgentSession, Agent, RoomInputOptions
+from livekit.agents import AgentSession, Agent, JobProcess, RoomInputOptions
 from livekit.plugins import google, cartesia, deepgram, noise_cancellation, silero
 # from livekit.plugins.turn_detector.multilingual import MultilingualModel
 import asyncio
+import logging
+import time
 from dotenv import load_dotenv
 import os
 from livekit.agents import Agent, function_tool, RunContext
-from rag.search import search_docs  # Pastikan fungsi ini mengembalikan string hasil pencarian
+from rag.search import search_docs_async, warmup, warmup_async  # Pastikan fungsi ini mengembalikan string hasil pencarian
+from rag.context import assemble_context
+from rag.metrics import retrieval_metrics
+from rag.speculative import SpeculativeRetriever
 
 # Load environment variables from a .env file
 load_dotenv()
 
+logger = logging.getLogger("nara-agent")
+
+# Opt-in: mulai retrieval dari transkrip interim sebelum tool dipanggil
+RAG_SPECULATIVE = os.getenv("RAG_SPECULATIVE", "0") == "1"
+# Mis. /var/lib/node_exporter/textfile/nara_rag_{pid}.prom ({pid} wajib: satu file per proses,
+# dihapus saat proses keluar); kosong = tidak diekspor
+RAG_METRICS_TEXTFILE = os.getenv("RAG_METRICS_TEXTFILE", "")
+RAG_METRICS_INTERVAL = float(os.getenv("RAG_METRICS_INTERVAL", "15"))
+# Jumlah kandidat chunk sebelum dedup/MMR dan pengemasan anggaran token
+RAG_CONTEXT_CANDIDATES = int(os.getenv("RAG_CONTEXT_CANDIDATES", "10"))
+
+
+def _format_timings(timings: dict) -> str:
+    return ", ".join(f"{stage}={seconds * 1000:.0f}ms" for stage, seconds in timings.items())
+
 
 class Assistant(Agent):
-    def __init__(self) -> None:
+    def __init__(self, speculative: SpeculativeRetriever | None = None) -> None:
         super().__init__(instructions="Kamu adalah Nara, AI Agent yang berperan sebagai staf TU di Universitas Kebangsaan Republik Indonesia.")
+        self._first_query_logged = False
+        self._speculative = speculative
 
     @function_tool()
     async def retrieve_info(self, context: RunContext, query: str) -> str:
         """Mencari informasi dari basis data kampus berdasarkan pertanyaan pengguna."""
-        results = search_docs(query)
-        if results:
-            return "\n".join(results)
-        return "Maaf, saya tidak menemukan informasi yang relevan."
+        start = time.perf_counter()
+        results = None
+        if self._speculative is not None:
+            results = await self._speculative.take(query)
+        if results is None:
+            results = await search_docs_async(query, top_k=RAG_CONTEXT_CANDIDATES)
+        if not self._first_query_logged:
+            self._first_query_logged = True
+            logger.info("retrieval pertama di sesi ini: %.0fms", (time.perf_counter() - start) * 1000)
+        with retrieval_metrics.span("format"):
+            context_chunks = assemble_context(results)
+            if context_chunks:
+                return "\n".join(context_chunks)
+            return "Maaf, saya tidak menemukan informasi yang relevan."
+
+
+def prewarm(proc: JobProcess):
+    """Hangatkan koneksi, embedding dan indeks sebelum job pertama diterima proses ini."""
+    if RAG_METRICS_TEXTFILE:
+        try:
+            retrieval_metrics.start_textfile_writer(RAG_METRICS_TEXTFILE, RAG_METRICS_INTERVAL)
+        except ValueError:
+            logger.exception("ekspor metrik RAG dimatikan")
+
+    start = time.perf_counter()
+    try:
+        timings = warmup()
+    except Exception:
+        # Worker tetap jalan; query pertama saja yang membayar cold start
+        logger.exception("prewarm RAG gagal")
+        return
+    logger.info(
+        "prewarm RAG selesai dalam %.0fms (%s)",
+        (time.perf_counter() - start) * 1000,
+        _format_timings(timings),
+    )
+
 
+async def _warmup_async_clients():
+    # Klien async terikat ke event loop job, jadi tidak bisa dihangatkan di prewarm
+    try:
+        timings = await warmup_async()
+        logger.info("warm-up klien async RAG: %s", _format_timings(timings))
+    except Exception:
+        logger.exception("warm-up klien async RAG gagal")
 
 
 async def entrypoint(ctx: agents.JobContext):
+    warmup_task = asyncio.create_task(_warmup_async_clients())
     await ctx.connect()
 
     session = AgentSession(
@@ -38,9 +101,24 @@ async def entrypoint(ctx: agents.JobContext):
             # instructions="You are a helpful assistant",
         ),
     )
+
+    speculative = None
+    if RAG_SPECULATIVE:
+        speculative = SpeculativeRetriever(search_docs_async, top_k=RAG_CONTEXT_CANDIDATES)
+
+        @session.on("user_input_transcribed")
+        def _on_user_transcript(ev):
+            speculative.on_transcript(ev.transcript, ev.is_final)
+
+        async def _close_speculative():
+            speculative.close()
+            logger.info("retrieval spekulatif: %s", speculative.stats())
+
+        ctx.add_shutdown_callback(_close_speculative)
+
     await session.start(
         room=ctx.room,
-        agent=Assistant(),
+        agent=Assistant(speculative=speculative),
         room_input_options=RoomInputOptions(
             # LiveKit Cloud enhanced noise cancellation
             # - If self-hosting, omit this parameter
@@ -52,7 +130,8 @@ async def entrypoint(ctx: agents.JobContext):
     await session.generate_reply(
         instructions="Kamu adalah Nara, AI Agent yang berperan sebagai staf TU di Universtas Kebangsaan Republik Indonesia."
     )
+    await warmup_task
 
 
 if __name__ == "__main__":
-    agents.cli.run_app(agents.WorkerOptions(entrypoint_fnc=entrypoint))
\ No newline at end of file
+    agents.cli.run_app(agents.WorkerOptions(entrypoint_fnc=entrypoint, prewarm_fnc=prewarm))
\ No newline at end of file
@@ -1,12 +1,29 @@
 import os
 import glob
-import markdown
+import shutil
+import hashlib
+import json
 from dotenv import load_dotenv
 from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams, PointStruct
+from qdrant_client.models import Distance, VectorParams, PointStruct, PointIdsList, PayloadSchemaType
 from google.generativeai import configure, embed_content
 import uuid
 import time
+import random
+import queue
+import threading
+from rag.chunking import iter_parsed_files
+from rag.dedup import NearDuplicateIndex
+from rag.embedding_store import open_store
+from rag.aliases import (
+    alias_target, garbage_collect, is_plain_collection, list_versions, new_version_name, swap_alias,
+)
+from rag.build_info import collection_dir, manifest_build_id, manifest_path, read_build_id, write_build_id
+from rag.cache import normalize_query
+from rag.facets import faculties_from_sources, hostname_from_url
+from rag.quantization import RAG_QUANTIZATION, RAG_VECTORS_ON_DISK, hnsw_config, quantization_config
+from rag.lexical import BM25Index
+from rag.ratelimit import TokenBucket, is_rate_limited
 
 # Load API Key
 load_dotenv()
@@ -18,74 +35,555 @@ qdrant = QdrantClient(
     api_key=os.getenv("QDRANT_API_KEY")
 )
 COLLECTION_NAME = os.getenv("QDRANT_COLLECTION", "nara_documents")
+# Blue/green: bangun koleksi berversi baru lalu pindahkan alias COLLECTION_NAME (lihat rag/aliases.py).
+# RAG_BLUE_GREEN=false untuk update inkremental langsung ke koleksi COLLECTION_NAME.
+BLUE_GREEN = os.getenv("RAG_BLUE_GREEN", "true").lower() == "true"
+KEEP_VERSIONS = int(os.getenv("RAG_KEEP_VERSIONS", "2"))
+# Query uji (dipisah "|") yang harus mengembalikan hasil sebelum alias dipindahkan
+SMOKE_QUERIES = [q.strip() for q in os.getenv(
+    "RAG_SMOKE_QUERIES", "Universitas Kebangsaan Republik Indonesia|Fakultas Teknologi Informasi"
+).split("|") if q.strip()]
+# Manifest, BM25 & build id disimpan per koleksi fisik di LOCAL_INDEX_DIR/<koleksi>/ (lihat rag/build_info.py)
+LOCAL_INDEX_DIR = os.getenv("RAG_LOCAL_INDEX_DIR", "./index")
+RECREATE_COLLECTION = os.getenv("RECREATE_COLLECTION", "false").lower() == "true"
+# Namespace tetap agar id point deterministik antar run
+POINT_ID_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, "https://ukri.ac.id/nara/points")
 
-# Cek & buat koleksi
-if not qdrant.collection_exists(collection_name=COLLECTION_NAME):
-    qdrant.create_collection(
-        collection_name=COLLECTION_NAME,
-        vectors_config=VectorParams(size=768, distance=Distance.COSINE),
-    )
+# Embedding: batch per request (maks. 100 untuk batchEmbedContents), worker paralel,
+# dan batas request per menit sesuai kuota Gemini
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "100"))
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "4"))
+EMBED_RPM = float(os.getenv("EMBED_RPM", "150"))
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "5"))
+EMBEDDING_MODEL = "models/embedding-001"
+embed_limiter = TokenBucket(EMBED_RPM)
+# Chunk yang teksnya sudah pernah di-embed diambil dari store lokal (RAG_EMBED_STORE_PATH)
+embed_store = open_store()
 
-def chunk_text(text, max_tokens=300):
-    paragraphs = text.split("\n\n")
-    chunks, current_chunk = [], ""
-    for para in paragraphs:
-        if len(current_chunk.split()) + len(para.split()) <= max_tokens:
-            current_chunk += para + "\n\n"
-        else:
-            chunks.append(current_chunk.strip())
-            current_chunk = para + "\n\n"
-    if current_chunk:
-        chunks.append(current_chunk.strip())
-    return chunks
+# Upsert paralel ke Qdrant dengan antrean berbatas, plus checkpoint untuk melanjutkan run yang terputus
+UPSERT_WORKERS = int(os.getenv("UPSERT_WORKERS", "4"))
+UPSERT_QUEUE_SIZE = int(os.getenv("UPSERT_QUEUE_SIZE", "8"))
+# Jumlah process untuk parse & chunk Markdown (default: semua core)
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", "0")) or os.cpu_count()
+# Ukuran chunk & overlap dalam token (lihat rag.chunking.count_tokens)
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "300"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "50"))
+CHECKPOINT_PATH = os.getenv("RAG_CHECKPOINT_PATH", os.path.join(LOCAL_INDEX_DIR, f"checkpoint_{COLLECTION_NAME}.jsonl"))
+# Peleburan dokumen & chunk near-duplicate (perkiraan Jaccard MinHash) sebelum embedding
+DEDUP_ENABLED = os.getenv("RAG_DEDUP", "1") != "0"
+DEDUP_DOC_THRESHOLD = float(os.getenv("DEDUP_DOC_THRESHOLD", "0.9"))
+DEDUP_CHUNK_THRESHOLD = float(os.getenv("DEDUP_CHUNK_THRESHOLD", "0.9"))
+# Field payload yang diberi indeks keyword untuk filtered search (lihat rag/facets.py)
+PAYLOAD_INDEX_FIELDS = ("faculty", "hostname")
+# Naikkan bila chunk_payload mendapat field baru: point lama yang tidak berubah
+# di-backfill sekali pada run inkremental berikutnya (lihat backfill_payload)
+PAYLOAD_VERSION = 2
+BACKFILL_FIELDS = ("sources", "faculty", "hostname")
+# Koleksi berversi yang sedang dibangun, agar run yang terputus melanjutkan ke koleksi yang sama
+BUILD_STATE_PATH = os.path.join(LOCAL_INDEX_DIR, f"build_{COLLECTION_NAME}.json")
 
-def process_markdown_file(path):
-    with open(path, "r", encoding="utf-8") as f:
-        md_text = f.read()
-        html = markdown.markdown(md_text)
-        plain_text = html.replace("<p>", "").replace("</p>", "\n")
-        return chunk_text(plain_text)
-
-def embed_texts(texts, batch_size=20):
-    vectors = []
-    for i in range(0, len(texts), batch_size):
-        batch = texts[i:i + batch_size]
+
+def ensure_collection(collection_name=COLLECTION_NAME):
+    """
+    Cek & buat koleksi. Dipanggil dari main() agar worker process pool tidak
+    ikut menjalankannya. Kuantisasi & penyimpanan on-disk diatur lewat env
+    (lihat rag/quantization.py) dan hanya berlaku untuk koleksi baru.
+    """
+    if RECREATE_COLLECTION and qdrant.collection_exists(collection_name=collection_name):
+        qdrant.delete_collection(collection_name=collection_name)
+    if not qdrant.collection_exists(collection_name=collection_name):
+        qdrant.create_collection(
+            collection_name=collection_name,
+            vectors_config=VectorParams(size=768, distance=Distance.COSINE, on_disk=RAG_VECTORS_ON_DISK),
+            quantization_config=quantization_config(),
+            hnsw_config=hnsw_config(),
+        )
+        print(f"🆕 Koleksi {collection_name} dibuat (kuantisasi: {RAG_QUANTIZATION}, "
+              f"vektor on-disk: {RAG_VECTORS_ON_DISK})")
+    existing = qdrant.get_collection(collection_name=collection_name).payload_schema or {}
+    for field in PAYLOAD_INDEX_FIELDS:
+        if field not in existing:
+            qdrant.create_payload_index(
+                collection_name=collection_name,
+                field_name=field,
+                field_schema=PayloadSchemaType.KEYWORD,
+                wait=True,
+            )
+
+
+def prepare_target():
+    """
+    Tentukan koleksi tujuan upsert. Mengembalikan (nama koleksi, resumed);
+    resumed False berarti koleksi baru sehingga checkpoint lama tidak berlaku.
+    """
+    if not BLUE_GREEN:
+        ensure_collection()
+        return COLLECTION_NAME, not RECREATE_COLLECTION
+
+    if os.path.exists(BUILD_STATE_PATH) and not RECREATE_COLLECTION:
+        with open(BUILD_STATE_PATH, "r", encoding="utf-8") as f:
+            target = json.load(f)["target"]
+        if qdrant.collection_exists(collection_name=target):
+            return target, True
+
+    target = new_version_name(COLLECTION_NAME)
+    ensure_collection(target)
+    save_manifest(BUILD_STATE_PATH, {"target": target})
+    return target, False
+
+
+def validate_collection(collection, expected_points):
+    """Cek jumlah point & smoke query sebelum koleksi baru dipakai; gagal = RuntimeError."""
+    count = qdrant.count(collection_name=collection, exact=True).count
+    if count != expected_points:
+        raise RuntimeError(f"Validasi {collection} gagal: {count} point, seharusnya {expected_points}")
+
+    # Key store = query dinormalisasi (sama dengan rag/search.py); yang di-embed teks aslinya
+    queries_by_key = {normalize_query(q): q for q in SMOKE_QUERIES}
+    keys = list(queries_by_key)
+
+    def embed_queries(missing):
+        content = [queries_by_key[k] for k in missing]
+        return embed_content(content=content, task_type="RETRIEVAL_QUERY", model=EMBEDDING_MODEL)["embedding"]
+
+    if embed_store is not None:
+        vectors = embed_store.embed(keys, EMBEDDING_MODEL, "RETRIEVAL_QUERY", embed_queries)
+    else:
+        vectors = embed_queries(keys)
+    for query, vector in zip(queries_by_key.values(), vectors):
+        hits = qdrant.search(collection_name=collection, query_vector=vector, limit=1)
+        if not hits or not hits[0].payload.get("text"):
+            raise RuntimeError(f"Validasi {collection} gagal: smoke query '{query}' tanpa hasil")
+    print(f"🔎 Validasi {collection}: {count} point, {len(SMOKE_QUERIES)} smoke query OK")
+
+def _embed_batch(batch, start_index):
+    """Embed satu batch dalam satu request, dengan retry exponential backoff."""
+    for attempt in range(EMBED_MAX_RETRIES + 1):
+        embed_limiter.acquire()
         try:
-            batch_vectors = [
-                embed_content(
-                    content=t,
-                    task_type="RETRIEVAL_DOCUMENT",
-                    model="models/embedding-001"
-                )["embedding"]
-                for t in batch
-            ]
-            vectors.extend(batch_vectors)
+            return embed_content(
+                content=batch,
+                task_type="RETRIEVAL_DOCUMENT",
+                model=EMBEDDING_MODEL
+            )["embedding"]
         except Exception as e:
-            print(f"⚠️ Gagal proses batch {i} - {i + batch_size}: {e}")
-            # Opsi retry ringan
-            time.sleep(1)
-    return vectors
+            if attempt == EMBED_MAX_RETRIES:
+                raise RuntimeError(
+                    f"Gagal embed batch {start_index} - {start_index + len(batch)} "
+                    f"setelah {EMBED_MAX_RETRIES} percobaan ulang: {e}"
+                ) from e
+            if is_rate_limited(e):
+                embed_limiter.drain()
+            delay = min(60.0, 2 ** attempt) + random.uniform(0, 1)
+            print(f"⚠️ Gagal proses batch {start_index} - {start_index + len(batch)}: {e} "
+                  f"(coba lagi dalam {delay:.1f} detik)")
+            time.sleep(delay)
 
 
-def main():
-    files = glob.glob("./data/**/*.md", recursive=True)
-    all_chunks = []
-    for path in files:
-        chunks = process_markdown_file(path)
+def embed_documents(batch, start_index):
+    """Seperti _embed_batch, tetapi hanya teks yang belum ada di embed_store yang dikirim ke API."""
+    if embed_store is None:
+        return _embed_batch(batch, start_index)
+    return embed_store.embed(
+        batch, EMBEDDING_MODEL, "RETRIEVAL_DOCUMENT", lambda missing: _embed_batch(missing, start_index)
+    )
+
+
+def content_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def point_id(source, chunk_hash, occurrence=0):
+    """Id deterministik: chunk yang sama di file yang sama selalu mendapat id yang sama."""
+    return str(uuid.uuid5(POINT_ID_NAMESPACE, f"{source}\x1f{chunk_hash}\x1f{occurrence}"))
+
+
+def load_manifest(path, collection=COLLECTION_NAME):
+    if RECREATE_COLLECTION or not os.path.exists(path):
+        return {"collection": collection, "files": {}}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(path, manifest):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def iter_chunks(files, manifest_files, extra_sources=None):
+    """
+    Chunk file (paralel, berurutan); entri manifest tiap file diisi ke `manifest_files`.
+
+    Bila `extra_sources` (dict id point -> list source) diberikan, dokumen dan
+    chunk yang near-duplicate dengan yang sudah muncul sebelumnya tidak
+    di-yield; path-nya dicatat di `extra_sources` milik point kanonik.
+    """
+    doc_index = NearDuplicateIndex(DEDUP_DOC_THRESHOLD) if extra_sources is not None else None
+    chunk_index = NearDuplicateIndex(DEDUP_CHUNK_THRESHOLD) if extra_sources is not None else None
+    doc_points = {}
+
+    def add_source(pid, source):
+        sources = extra_sources.setdefault(pid, [])
+        if source not in sources:
+            sources.append(source)
+
+    parsed = iter_parsed_files(files, PARSE_WORKERS, CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS)
+    for path, file_hash, meta, chunks in parsed:
+        source = os.path.relpath(path, "./data")
+        hostname = hostname_from_url(meta.get("url"))
+        if doc_index is not None:
+            duplicate_of = doc_index.add(source, "\n\n".join(c["text"] for c in chunks))
+            if duplicate_of is not None:
+                for pid in doc_points[duplicate_of]:
+                    add_source(pid, source)
+                manifest_files[source] = {"hash": file_hash, "chunks": {}, "duplicate_of": duplicate_of}
+                continue
+
+        chunk_entries, seen = {}, {}
+        # Point kanonik yang mewakili setiap chunk file ini, termasuk yang dilebur
+        doc_points[source] = points = []
         for chunk in chunks:
-            all_chunks.append({
-                "id": str(uuid.uuid4()),
-                "text": chunk,
-                "source": os.path.relpath(path, "./data")
-            })
-
-    print(f"Total chunks: {len(all_chunks)}")
-    vectors = embed_texts([c["text"] for c in all_chunks])
-    payloads = [{"text": c["text"], "source": c["source"]} for c in all_chunks]
-    points = [PointStruct(id=c["id"], vector=v, payload=p) for c, v, p in zip(all_chunks, vectors, payloads)]
-
-    qdrant.upsert(collection_name=COLLECTION_NAME, points=points)
-    print("✅ Embedding sukses & dimasukkan ke Qdrant")
+            chunk_hash = content_hash(f"{chunk['heading']}\n{chunk['text']}")
+            occurrence = seen.get(chunk_hash, 0)
+            seen[chunk_hash] = occurrence + 1
+            pid = point_id(source, chunk_hash, occurrence)
+            if chunk_index is not None:
+                duplicate_of = chunk_index.add(pid, f"{chunk['heading']}\n{chunk['text']}")
+                if duplicate_of is not None:
+                    if duplicate_of not in chunk_entries:
+                        add_source(duplicate_of, source)
+                        points.append(duplicate_of)
+                    continue
+            chunk_entries[pid] = chunk_hash
+            points.append(pid)
+            yield {
+                "id": pid,
+                "text": chunk["text"],
+                "heading": chunk["heading"],
+                "source": source,
+                "hostname": hostname,
+                "chunk_hash": chunk_hash,
+            }
+        manifest_files[source] = {"hash": file_hash, "chunks": chunk_entries}
+
+
+class Checkpoint:
+    """Daftar id point yang sudah di-upsert pada run yang belum selesai (JSONL, append-only)."""
+
+    def __init__(self, path):
+        self.path = path
+        self.done = set()
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        self.done.update(json.loads(line))
+                    except json.JSONDecodeError:
+                        # Baris terakhir bisa terpotong bila proses mati saat menulis
+                        break
+
+    def record(self, ids):
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(ids) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self.done.update(ids)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.done.clear()
+
+
+_STOP = object()
+
+
+class _Stage:
+    """Sekumpulan worker thread yang membaca dari antrean berbatas (backpressure)."""
+
+    def __init__(self, name, fn, workers, maxsize):
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.error = None
+        self._fn = fn
+        self._threads = [
+            threading.Thread(target=self._run, name=f"{name}-{i}", daemon=True) for i in range(workers)
+        ]
+        for t in self._threads:
+            t.start()
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is _STOP:
+                return
+            # Setelah error, item tetap dikonsumsi agar producer tidak macet
+            if self.error is None:
+                try:
+                    self._fn(item)
+                except Exception as e:
+                    self.error = e
+
+    def put(self, item):
+        if self.error is not None:
+            raise self.error
+        self.queue.put(item)
+
+    def close(self):
+        for _ in self._threads:
+            self.queue.put(_STOP)
+        for t in self._threads:
+            t.join()
+
+
+def chunk_payload(chunk):
+    return {
+        "text": chunk["text"],
+        "heading": chunk["heading"],
+        "source": chunk["source"],
+        # Semua file yang memuat chunk ini; duplikat ditambahkan setelah stream selesai
+        "sources": [chunk["source"]],
+        "faculty": faculties_from_sources([chunk["source"]]),
+        "hostname": chunk["hostname"],
+        "chunk_hash": chunk["chunk_hash"],
+    }
+
+
+def sync_sources(old_sources, new_sources, manifest_files, collection_name=COLLECTION_NAME):
+    """
+    Set payload `sources` (dan `faculty` turunannya) untuk point yang daftar
+    sumbernya berubah sejak run sebelumnya. Point tanpa duplikat kembali ke
+    [source] miliknya sendiri.
+    """
+    pid_source = {pid: source for source, entry in manifest_files.items() for pid in entry["chunks"]}
+    groups = {}
+    for pid in set(old_sources) | set(new_sources):
+        if pid not in pid_source or old_sources.get(pid) == new_sources.get(pid):
+            continue
+        sources = new_sources.get(pid) or [pid_source[pid]]
+        groups.setdefault(tuple(sources), []).append(pid)
+    for sources, pids in groups.items():
+        qdrant.set_payload(
+            collection_name=collection_name,
+            payload={"sources": list(sources), "faculty": faculties_from_sources(sources)},
+            points=sorted(pids),
+            wait=True,
+        )
+    return sum(len(pids) for pids in groups.values())
+
+
+def publish_artifacts(collection, manifest, bm25):
+    """
+    Simpan indeks BM25, manifest dan build id milik `collection` (koleksi
+    fisik). rag/search.py hanya membacanya selama alias menunjuk koleksi ini.
+    """
+    bm25.finalize()
+    print(f"✅ Indeks BM25 disimpan di {bm25.save(collection_dir(LOCAL_INDEX_DIR, collection))}")
+    manifest["collection"] = collection
+    save_manifest(manifest_path(LOCAL_INDEX_DIR, collection), manifest)
+    # Penanda versi untuk cache hasil di rag/search.py, ditulis terakhir
+    build_id = manifest_build_id({"files": manifest["files"], "sources": manifest["sources"]})
+    write_build_id(LOCAL_INDEX_DIR, collection, build_id)
+
+
+def backfill_payload(pids, payloads, collection_name=COLLECTION_NAME):
+    """
+    Set field BACKFILL_FIELDS untuk point yang tidak di-upsert ulang (chunk
+    tidak berubah), dikelompokkan per nilai agar jumlah request tetap kecil.
+    """
+    groups = {}
+    for pid in pids:
+        payload = payloads[pid]
+        values = {field: payload[field] for field in BACKFILL_FIELDS}
+        groups.setdefault(json.dumps(values, sort_keys=True), []).append(pid)
+    for values, group in groups.items():
+        qdrant.set_payload(
+            collection_name=collection_name,
+            payload=json.loads(values),
+            points=sorted(group),
+            wait=True,
+        )
+    return len(pids)
+
+
+def diff_manifest(old_files, new_files):
+    old_ids = {pid for entry in old_files.values() for pid in entry["chunks"]}
+    new_ids = {pid for entry in new_files.values() for pid in entry["chunks"]}
+    report = {
+        "files_new": sorted(set(new_files) - set(old_files)),
+        "files_removed": sorted(set(old_files) - set(new_files)),
+        "files_changed": sorted(
+            s for s in set(new_files) & set(old_files) if new_files[s]["hash"] != old_files[s]["hash"]
+        ),
+        "chunks_added": new_ids - old_ids,
+        "chunks_deleted": old_ids - new_ids,
+        "chunks_unchanged": new_ids & old_ids,
+    }
+    report["files_unchanged"] = len(new_files) - len(report["files_new"]) - len(report["files_changed"])
+    return report
+
+
+def print_report(report):
+    print("📋 Perubahan sejak run sebelumnya:")
+    print(f"   File baru     : {len(report['files_new'])}")
+    print(f"   File berubah  : {len(report['files_changed'])}")
+    print(f"   File dihapus  : {len(report['files_removed'])}")
+    print(f"   File tetap    : {report['files_unchanged']}")
+    print(f"   Chunk baru    : {len(report['chunks_added'])}")
+    print(f"   Chunk dihapus : {len(report['chunks_deleted'])}")
+    print(f"   Chunk tetap   : {len(report['chunks_unchanged'])}")
+    for label, key in (("+", "files_new"), ("~", "files_changed"), ("-", "files_removed")):
+        for source in report[key]:
+            print(f"   {label} {source}")
+
+
+def main():
+    target, resumed = prepare_target()
+    blue_green = target != COLLECTION_NAME
+    # Koleksi fisik yang sedang dilayani; manifest-nya menjadi pembanding run ini
+    live = alias_target(qdrant, COLLECTION_NAME) or COLLECTION_NAME
+    if blue_green:
+        print(f"🟦 Membangun koleksi {target} (alias {COLLECTION_NAME} dipindahkan setelah validasi)")
+    # Urutan tetap agar dokumen kanonik dari sekumpulan duplikat selalu sama antar run
+    files = sorted(glob.glob("./data/**/*.md", recursive=True))
+    manifest = load_manifest(manifest_path(LOCAL_INDEX_DIR, live), live)
+    # Koleksi blue/green selalu mulai kosong; manifest lama hanya dipakai untuk laporan
+    old_ids = set() if blue_green else {pid for entry in manifest["files"].values() for pid in entry["chunks"]}
+
+    checkpoint = Checkpoint(CHECKPOINT_PATH)
+    if not resumed:
+        checkpoint.clear()
+    elif checkpoint.done:
+        print(f"⏯️ Melanjutkan run sebelumnya: {len(checkpoint.done)} chunk sudah ada di {target}")
+
+    progress = {"upserted": 0}
+    progress_lock = threading.Lock()
+
+    def upsert_points(points):
+        qdrant.upsert(collection_name=target, points=points, wait=True)
+        checkpoint.record([p.id for p in points])
+        with progress_lock:
+            progress["upserted"] += len(points)
+            print(f"   ⬆️ {progress['upserted']} chunk di-upsert")
+
+    upsert_stage = _Stage("upsert", upsert_points, UPSERT_WORKERS, UPSERT_QUEUE_SIZE)
+
+    def embed_batch(item):
+        offset, batch = item
+        vectors = embed_documents([c["text"] for c in batch], offset)
+        upsert_stage.put([
+            PointStruct(id=c["id"], vector=v, payload=chunk_payload(c)) for c, v in zip(batch, vectors)
+        ])
+
+    embed_stage = _Stage("embed", embed_batch, EMBED_CONCURRENCY, EMBED_CONCURRENCY * 2)
+
+    # Indeks BM25 memakai id point yang sama agar bisa difusikan dengan hasil vektor
+    bm25 = BM25Index()
+    bm25_payloads = {}
+    manifest_files = {}
+    extra_sources = {} if DEDUP_ENABLED else None
+    total_chunks = 0
+    queued = 0
+    batch = []
+    try:
+        for chunk in iter_chunks(files, manifest_files, extra_sources):
+            total_chunks += 1
+            bm25_payloads[chunk["id"]] = chunk_payload(chunk)
+            bm25.add(chunk["id"], chunk["text"], bm25_payloads[chunk["id"]])
+            if chunk["id"] in old_ids or chunk["id"] in checkpoint.done:
+                continue
+            batch.append(chunk)
+            if len(batch) == EMBED_BATCH_SIZE:
+                embed_stage.put((queued, batch))
+                queued += len(batch)
+                batch = []
+        if batch:
+            embed_stage.put((queued, batch))
+    finally:
+        embed_stage.close()
+        upsert_stage.close()
+    for stage in (embed_stage, upsert_stage):
+        if stage.error is not None:
+            raise RuntimeError(
+                f"Ingestion berhenti: {stage.error}. Jalankan ulang untuk melanjutkan dari checkpoint."
+            ) from stage.error
+
+    print(f"Total chunks: {total_chunks}")
+    new_sources = {}
+    if extra_sources:
+        for pid, sources in extra_sources.items():
+            payload = bm25_payloads[pid]
+            payload["sources"] = [payload["source"], *sources]
+            payload["faculty"] = faculties_from_sources(payload["sources"])
+            new_sources[pid] = payload["sources"]
+        n_docs = sum(1 for entry in manifest_files.values() if "duplicate_of" in entry)
+        print(f"🧬 Duplikat dilebur: {n_docs} dokumen, {len(new_sources)} chunk kanonik punya >1 sumber")
+    report = diff_manifest(manifest["files"], manifest_files)
+    print_report(report)
+    print(f"✅ {progress['upserted']} chunk baru di-embed & dimasukkan ke Qdrant")
+    if embed_store is not None:
+        stats = embed_store.stats()
+        print(f"💾 Embedding store: {stats['hits']} chunk diambil dari {embed_store.path}, "
+              f"{stats['misses']} di-embed lewat API")
+
+    if report["chunks_deleted"] and not blue_green:
+        qdrant.delete(
+            collection_name=COLLECTION_NAME,
+            points_selector=PointIdsList(points=sorted(report["chunks_deleted"])),
+        )
+        print(f"🗑️ {len(report['chunks_deleted'])} chunk lama dihapus dari Qdrant")
+
+    old_sources = {} if blue_green else manifest.get("sources", {})
+    n_synced = sync_sources(old_sources, new_sources, manifest_files, target)
+    if n_synced:
+        print(f"🔗 Payload sources diperbarui untuk {n_synced} chunk")
+    if not blue_green and manifest.get("payload_version", 1) < PAYLOAD_VERSION:
+        n_filled = backfill_payload(report["chunks_unchanged"], bm25_payloads, target)
+        if n_filled:
+            print(f"🏷️ Payload {', '.join(BACKFILL_FIELDS)} di-backfill untuk {n_filled} chunk lama")
+
+    manifest["files"] = manifest_files
+    manifest["sources"] = new_sources
+    manifest["payload_version"] = PAYLOAD_VERSION
+    if blue_green:
+        try:
+            validate_collection(target, total_chunks)
+        except RuntimeError:
+            # Run berikutnya membangun koleksi baru; yang gagal tidak punya build id
+            # sehingga dihapus oleh garbage collection berikutnya
+            os.remove(BUILD_STATE_PATH)
+            checkpoint.clear()
+            raise
+        # Artefak ditulis ke direktori koleksi baru sebelum alias pindah, jadi begitu
+        # alias menunjuk target, BM25 & build id-nya sudah ada. Koleksi yang sedang
+        # dilayani tetap memakai artefaknya sendiri sampai swap/migrate.
+        publish_artifacts(target, manifest, bm25)
+        previous = None
+        if is_plain_collection(qdrant, COLLECTION_NAME):
+            # Migrasi menghapus koleksi yang sedang dipakai agent, jadi tidak dilakukan otomatis
+            print(f"⚠️ {COLLECTION_NAME} masih koleksi biasa; {target} sudah siap tetapi alias belum dipindah. "
+                  f"Jalankan `python -m rag.aliases migrate --to {target}`.")
+        else:
+            previous = swap_alias(qdrant, COLLECTION_NAME, target)
+            print(f"🔀 Alias {COLLECTION_NAME}: {previous or '(baru)'} -> {target}")
+        os.remove(BUILD_STATE_PATH)
+        # Hanya versi yang lolos validasi (punya build id) yang disimpan untuk rollback
+        valid = {v for v in list_versions(qdrant, COLLECTION_NAME) if read_build_id(LOCAL_INDEX_DIR, v)}
+        removed = garbage_collect(
+            qdrant, COLLECTION_NAME, keep=KEEP_VERSIONS,
+            exclude={target, previous} - {None}, valid=valid,
+        )
+        for name in removed:
+            shutil.rmtree(collection_dir(LOCAL_INDEX_DIR, name), ignore_errors=True)
+        if removed:
+            print(f"🗑️ Versi lama dihapus: {', '.join(removed)}")
+    else:
+        publish_artifacts(live, manifest, bm25)
+    checkpoint.clear()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,150 @@
+"""
+Reindex blue/green lewat alias Qdrant. QDRANT_COLLECTION adalah alias yang
+dibaca rag/search.py; preprocesing.py membangun koleksi berversi baru
+(`<alias>_v<timestamp>`), memvalidasinya, lalu memindahkan alias secara
+atomik. Versi lama disimpan untuk rollback sampai dibersihkan oleh gc.
+
+    python -m rag.aliases status
+    python -m rag.aliases rollback
+    python -m rag.aliases gc --keep 2
+
+Bila QDRANT_COLLECTION masih berupa koleksi biasa (sebelum blue/green),
+alias belum bisa dibuat dengan nama yang sama. Migrasi dilakukan sekali
+secara eksplisit karena koleksi lama harus dihapus dulu (retrieval terhenti
+sesaat dan koleksi lama tidak bisa di-rollback):
+
+    python -m rag.aliases migrate --to <alias>_v<timestamp>
+"""
+import re
+import time
+from typing import Optional
+
+from qdrant_client.models import (
+    CreateAlias,
+    CreateAliasOperation,
+    DeleteAlias,
+    DeleteAliasOperation,
+)
+
+
+def new_version_name(alias: str) -> str:
+    return f"{alias}_v{time.strftime('%Y%m%d%H%M%S')}"
+
+
+def list_versions(client, alias: str) -> list[str]:
+    """Koleksi berversi milik `alias`, dari yang terlama."""
+    pattern = re.compile(rf"^{re.escape(alias)}_v\d+$")
+    names = [c.name for c in client.get_collections().collections]
+    return sorted(name for name in names if pattern.match(name))
+
+
+def alias_target(client, alias: str) -> Optional[str]:
+    for description in client.get_aliases().aliases:
+        if description.alias_name == alias:
+            return description.collection_name
+    return None
+
+
+async def alias_target_async(client, alias: str) -> Optional[str]:
+    for description in (await client.get_aliases()).aliases:
+        if description.alias_name == alias:
+            return description.collection_name
+    return None
+
+
+def is_plain_collection(client, alias: str) -> bool:
+    """True bila `alias` masih nama koleksi biasa (perlu `migrate` sebelum swap)."""
+    return alias_target(client, alias) is None and client.collection_exists(collection_name=alias)
+
+
+def swap_alias(client, alias: str, collection: str, migrate: bool = False) -> Optional[str]:
+    """
+    Arahkan `alias` ke `collection` dalam satu operasi atomik. Mengembalikan
+    koleksi yang sebelumnya ditunjuk alias. Bila `alias` masih koleksi biasa,
+    RuntimeError kecuali `migrate=True` (koleksi lama dihapus, tidak atomik).
+    """
+    previous = alias_target(client, alias)
+    operations = []
+    if previous is not None:
+        operations.append(DeleteAliasOperation(delete_alias=DeleteAlias(alias_name=alias)))
+    elif client.collection_exists(collection_name=alias):
+        if not migrate:
+            raise RuntimeError(
+                f"'{alias}' masih koleksi biasa, bukan alias. Jalankan sekali "
+                f"`python -m rag.aliases migrate --to {collection}` (retrieval terhenti sesaat)."
+            )
+        # Nama alias tidak boleh sama dengan koleksi yang ada, jadi koleksi lama dihapus
+        print(f"⚠️ '{alias}' masih koleksi biasa; dihapus agar bisa dipakai sebagai alias")
+        client.delete_collection(collection_name=alias)
+    operations.append(
+        CreateAliasOperation(create_alias=CreateAlias(collection_name=collection, alias_name=alias))
+    )
+    client.update_collection_aliases(change_aliases_operations=operations)
+    return previous
+
+
+def rollback(client, alias: str) -> str:
+    """Kembalikan alias ke versi sebelum versi yang sedang aktif."""
+    current = alias_target(client, alias)
+    older = [v for v in list_versions(client, alias) if current is None or v < current]
+    if not older:
+        raise RuntimeError(f"Tidak ada versi lama dari '{alias}' untuk rollback")
+    swap_alias(client, alias, older[-1])
+    return older[-1]
+
+
+def garbage_collect(client, alias: str, keep: int = 2, exclude=(), valid=None) -> list[str]:
+    """
+    Hapus versi lama, sisakan `keep` versi terbaru. Bila `valid` diberikan,
+    hanya versi di dalamnya yang dihitung dan disimpan; build yang gagal
+    validasi ikut dihapus. Versi yang sedang aktif dan yang ada di `exclude`
+    (mis. versi aktif sebelumnya) tidak pernah dihapus.
+    """
+    current = alias_target(client, alias)
+    versions = list_versions(client, alias)
+    good = [v for v in versions if valid is None or v in valid]
+    kept = set(good[-keep:]) if keep > 0 else set()
+    removed = []
+    for name in versions:
+        if name in kept or name == current or name in exclude:
+            continue
+        client.delete_collection(collection_name=name)
+        removed.append(name)
+    return removed
+
+
+if __name__ == "__main__":
+    import argparse
+    import os
+
+    from dotenv import load_dotenv
+    from qdrant_client import QdrantClient
+
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Kelola alias & versi koleksi Qdrant (blue/green)")
+    parser.add_argument("command", choices=["status", "rollback", "gc", "migrate"])
+    parser.add_argument("--alias", default=os.getenv("QDRANT_COLLECTION", "nara_documents"))
+    parser.add_argument("--keep", type=int, default=int(os.getenv("RAG_KEEP_VERSIONS", "2")))
+    parser.add_argument("--to", help="migrate: koleksi berversi tujuan alias (default: versi terbaru)")
+    args = parser.parse_args()
+
+    qdrant = QdrantClient(url=os.getenv("QDRANT_URL"), api_key=os.getenv("QDRANT_API_KEY"))
+    if args.command == "status":
+        current = alias_target(qdrant, args.alias)
+        print(f"Alias {args.alias} -> {current or '(belum ada)'}")
+        for name in list_versions(qdrant, args.alias):
+            count = qdrant.count(collection_name=name, exact=True).count
+            print(f"   {'*' if name == current else ' '} {name} ({count} point)")
+    elif args.command == "migrate":
+        versions = list_versions(qdrant, args.alias)
+        target = args.to or (versions[-1] if versions else None)
+        if target is None:
+            raise SystemExit(f"Belum ada versi '{args.alias}_v...'; jalankan preprocesing.py terlebih dahulu")
+        swap_alias(qdrant, args.alias, target, migrate=True)
+        print(f"🔀 Alias {args.alias} sekarang menunjuk {target}")
+    elif args.command == "rollback":
+        print(f"↩️ Alias {args.alias} sekarang menunjuk {rollback(qdrant, args.alias)}")
+    else:
+        removed = garbage_collect(qdrant, args.alias, keep=args.keep)
+        print(f"🗑️ {len(removed)} versi lama dihapus: {', '.join(removed) or '-'}")
@@ -0,0 +1,53 @@
+"""
+Artefak lokal per koleksi fisik. preprocesing.py menyimpan manifest, indeks
+BM25 dan `build id` (hash manifest file + chunk) di
+RAG_LOCAL_INDEX_DIR/<koleksi>/, dengan <koleksi> = koleksi di balik alias
+(mis. nara_documents_v20250101120000). rag/search.py membacanya untuk
+koleksi yang sedang ditunjuk alias, sehingga rollback atau build yang belum
+dipindahkan tidak tercampur dengan versi yang sedang dilayani. Build id
+dipakai sebagai versi koleksi untuk cache hasil: chunk yang diedit di tempat
+(jumlah point tetap) tetap membuang cache.
+"""
+import hashlib
+import json
+import os
+import time
+from typing import Optional
+
+BUILD_FILE = "build.json"
+MANIFEST_FILE = "manifest.json"
+
+
+def collection_dir(index_dir: str, collection: str) -> str:
+    return os.path.join(index_dir, collection)
+
+
+def build_info_path(index_dir: str, collection: str) -> str:
+    return os.path.join(collection_dir(index_dir, collection), BUILD_FILE)
+
+
+def manifest_path(index_dir: str, collection: str) -> str:
+    return os.path.join(collection_dir(index_dir, collection), MANIFEST_FILE)
+
+
+def manifest_build_id(manifest: dict) -> str:
+    raw = json.dumps(manifest, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def write_build_id(index_dir: str, collection: str, build_id: str) -> str:
+    path = build_info_path(index_dir, collection)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({"build_id": build_id, "built_at": time.time()}, f)
+    os.replace(path + ".tmp", path)
+    return path
+
+
+def read_build_id(index_dir: str, collection: str) -> Optional[str]:
+    """Build id koleksi, atau None bila belum ada / tidak terbaca."""
+    try:
+        with open(build_info_path(index_dir, collection), encoding="utf-8") as f:
+            return json.load(f)["build_id"]
+    except (OSError, ValueError, KeyError):
+        return None
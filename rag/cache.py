@@ -0,0 +1,247 @@
+import asyncio
+import hashlib
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+
+from rag.embedding_store import EmbeddingStore
+
+
+def normalize_query(text: str) -> str:
+    """Samakan bentuk query agar variasi spasi/kapital memakai entri cache yang sama."""
+    text = unicodedata.normalize("NFKC", text).casefold()
+    return " ".join(text.split())
+
+
+def make_key(text: str, model: str, task_type: str) -> str:
+    raw = f"{model}\x1f{task_type}\x1f{normalize_query(text)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Cache embedding query: LRU in-memory dengan TTL, plus tier persisten
+    opsional di EmbeddingStore bersama (rag/embedding_store.py) yang tetap ada
+    setelah worker restart. Query disimpan di store dalam bentuk normalisasi.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: float = 86400.0, store: Optional[EmbeddingStore] = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple[float, list[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._store = store
+        # Penulisan ke store dari put_async yang masih berjalan
+        self._writes: set = set()
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.miss_seconds = 0.0
+
+    def _expired(self, created: float) -> bool:
+        return self.ttl > 0 and time.time() - created > self.ttl
+
+    def get(self, text: str, model: str, task_type: str) -> Optional[list[float]]:
+        vector = self._get_memory(text, model, task_type)
+        if vector is None:
+            vector = self._get_stored(text, model, task_type)
+        if vector is None:
+            with self._lock:
+                self.misses += 1
+        return vector
+
+    async def get_async(self, text: str, model: str, task_type: str) -> Optional[list[float]]:
+        """Seperti get(); tier SQLite dibaca di thread agar event loop tidak ikut menunggu lock WAL."""
+        vector = self._get_memory(text, model, task_type)
+        if vector is None and self._store is not None:
+            vector = await asyncio.to_thread(self._get_stored, text, model, task_type)
+        if vector is None:
+            with self._lock:
+                self.misses += 1
+        return vector
+
+    def _get_memory(self, text: str, model: str, task_type: str) -> Optional[list[float]]:
+        key = make_key(text, model, task_type)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            created, vector = entry
+            if self._expired(created):
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            self.memory_hits += 1
+            return vector
+
+    def _get_stored(self, text: str, model: str, task_type: str) -> Optional[list[float]]:
+        if self._store is None:
+            return None
+        # I/O SQLite di luar self._lock: lookup memori di thread lain tidak ikut tertahan
+        vector = self._store.get(normalize_query(text), model, task_type, max_age=self.ttl)
+        if vector is None:
+            return None
+        with self._lock:
+            self._put_memory(make_key(text, model, task_type), time.time(), vector)
+            self.disk_hits += 1
+        return vector
+
+    def put(self, text: str, model: str, task_type: str, vector: list[float], elapsed: float = 0.0) -> None:
+        """Simpan embedding; `elapsed` adalah lama panggilan embed yang baru saja dibayar."""
+        self._remember(text, model, task_type, vector, elapsed)
+        if self._store is not None:
+            self._store.put(normalize_query(text), model, task_type, vector)
+
+    def put_async(self, text: str, model: str, task_type: str, vector: list[float], elapsed: float = 0.0) -> None:
+        """
+        Seperti put() untuk event loop: memori diisi langsung, penulisan ke
+        SQLite berjalan di thread tanpa ditunggu (gagal tulis hanya dilewati).
+        """
+        self._remember(text, model, task_type, vector, elapsed)
+        if self._store is not None:
+            task = asyncio.ensure_future(asyncio.to_thread(
+                self._store.put, normalize_query(text), model, task_type, vector
+            ))
+            self._writes.add(task)
+            task.add_done_callback(self._write_done)
+
+    def _write_done(self, task) -> None:
+        self._writes.discard(task)
+        if not task.cancelled():
+            task.exception()
+
+    def _remember(self, text: str, model: str, task_type: str, vector: list[float], elapsed: float) -> None:
+        with self._lock:
+            self.miss_seconds += elapsed
+            self._put_memory(make_key(text, model, task_type), time.time(), list(vector))
+
+    def _put_memory(self, key: str, created: float, vector: list[float]) -> None:
+        self._entries[key] = (created, vector)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            avg_miss = self.miss_seconds / self.misses if self.misses else 0.0
+            return {
+                "hits": hits,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "size": len(self._entries),
+                "avg_embed_seconds": avg_miss,
+                "estimated_seconds_saved": hits * avg_miss,
+                "embed_calls_saved": hits,
+            }
+
+
+class SemanticResultCache:
+    """
+    Cache hasil retrieval berbasis kemiripan embedding query. Query yang
+    parafrase (cosine >= threshold) memakai ulang daftar hit tanpa ke Qdrant.
+    `scope` (mis. filter payload) ikut menjadi bagian key: entri hanya
+    dipakai untuk scope yang sama. Semua entri dibuang saat versi koleksi berubah.
+    """
+
+    def __init__(self, max_size: int = 256, threshold: float = 0.95):
+        self.max_size = max_size
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._matrix = None
+        self._results: list = []
+        self._top_k: list[int] = []
+        self._scopes: list[Optional[str]] = []
+        self._last_used: list[float] = []
+        self._version: Optional[str] = None
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _unit(vector):
+        v = np.asarray(vector, dtype=np.float32)
+        norm = float(np.linalg.norm(v))
+        return v / norm if norm else v
+
+    def _check_version(self, version: Optional[str]) -> None:
+        if version != self._version:
+            if self._results:
+                self.invalidations += 1
+            self._matrix = None
+            self._results, self._top_k, self._scopes, self._last_used = [], [], [], []
+            self._version = version
+
+    def get(self, vector, top_k: int, version: Optional[str] = None, scope: Optional[str] = None):
+        with self._lock:
+            self._check_version(version)
+            if not self._results:
+                self.misses += 1
+                return None
+
+            count = len(self._results)
+            sims = self._matrix[:count] @ self._unit(vector)
+            sims[np.asarray(self._top_k) < top_k] = -1.0
+            sims[[s != scope for s in self._scopes]] = -1.0
+            best = int(np.argmax(sims))
+            if sims[best] < self.threshold:
+                self.misses += 1
+                return None
+
+            self._last_used[best] = time.monotonic()
+            self.hits += 1
+            return self._results[best][:top_k]
+
+    def put(self, vector, top_k: int, results: list, version: Optional[str] = None,
+            scope: Optional[str] = None) -> None:
+        if self.max_size <= 0:
+            return
+        unit = self._unit(vector)
+        with self._lock:
+            self._check_version(version)
+            if self._matrix is None:
+                self._matrix = np.zeros((self.max_size, unit.shape[0]), dtype=np.float32)
+
+            if len(self._results) < self.max_size:
+                slot = len(self._results)
+                self._results.append(None)
+                self._top_k.append(0)
+                self._scopes.append(None)
+                self._last_used.append(0.0)
+            else:
+                slot = min(range(len(self._last_used)), key=self._last_used.__getitem__)
+
+            self._matrix[slot] = unit
+            self._results[slot] = list(results)
+            self._top_k[slot] = top_k
+            self._scopes[slot] = scope
+            self._last_used[slot] = time.monotonic()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._check_version(None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "size": len(self._results),
+                "invalidations": self.invalidations,
+                "version": self._version,
+            }
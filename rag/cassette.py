@@ -0,0 +1,127 @@
+"""
+Record/replay ("cassette") untuk panggilan layanan eksternal di harness
+evaluasi: generate_content, embed_content dan pencarian Qdrant.
+
+- record: panggilan asli dijalankan, respons + latensinya disimpan dengan
+  key hash dari request (SQLite, isi dikompresi zlib).
+- replay: respons diambil dari cassette tanpa jaringan; request yang belum
+  terekam menimbulkan CassetteMiss. Latensi bisa disimulasikan
+  (`latency_scale` 1.0 = sama dengan saat direkam, 0 = tanpa jeda).
+- auto: replay bila ada, selain itu record.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Awaitable, Callable, Optional
+
+MODES = ("off", "record", "replay", "auto")
+
+
+class CassetteMiss(KeyError):
+    pass
+
+
+def request_key(kind: str, request: dict) -> str:
+    raw = json.dumps({"kind": kind, "request": request}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class Cassette:
+    def __init__(self, path: str, mode: str = "replay", latency_scale: float = 0.0):
+        if mode not in MODES[1:]:
+            raise ValueError(f"Mode cassette harus salah satu dari {MODES[1:]}, bukan '{mode}'")
+        self.path = path
+        self.mode = mode
+        self.latency_scale = latency_scale
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, kind TEXT NOT NULL, response BLOB NOT NULL, latency REAL NOT NULL)"
+        )
+        self._db.commit()
+
+        self.recorded = 0
+        self.replayed = 0
+
+    def _lookup(self, key: str) -> Optional[tuple[Any, float]]:
+        if self.mode == "record":
+            return None
+        with self._lock:
+            row = self._db.execute("SELECT response, latency FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            if self.mode == "replay":
+                raise CassetteMiss(key)
+            return None
+        self.replayed += 1
+        return json.loads(zlib.decompress(row[0])), row[1]
+
+    def _store(self, key: str, kind: str, value: Any, latency: float) -> None:
+        blob = zlib.compress(json.dumps(value, ensure_ascii=False).encode("utf-8"))
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, kind, response, latency) VALUES (?, ?, ?, ?)",
+                (key, kind, blob, latency),
+            )
+            self._db.commit()
+            self.recorded += 1
+
+    def call(
+        self,
+        kind: str,
+        request: dict,
+        fn: Callable[[], Any],
+        encode: Callable[[Any], Any] = lambda x: x,
+        decode: Callable[[Any], Any] = lambda x: x,
+    ) -> Any:
+        """
+        Jalankan `fn()` lewat cassette. `encode` mengubah hasil menjadi nilai
+        JSON untuk disimpan; `decode` membangun ulang hasil saat replay.
+        """
+        key = request_key(kind, request)
+        found = self._lookup(key)
+        if found is not None:
+            value, latency = found
+            if self.latency_scale > 0:
+                time.sleep(latency * self.latency_scale)
+            return decode(value)
+        start = time.perf_counter()
+        result = fn()
+        self._store(key, kind, encode(result), time.perf_counter() - start)
+        return result
+
+    async def call_async(
+        self,
+        kind: str,
+        request: dict,
+        fn: Callable[[], Awaitable[Any]],
+        encode: Callable[[Any], Any] = lambda x: x,
+        decode: Callable[[Any], Any] = lambda x: x,
+    ) -> Any:
+        key = request_key(kind, request)
+        found = self._lookup(key)
+        if found is not None:
+            value, latency = found
+            if self.latency_scale > 0:
+                await asyncio.sleep(latency * self.latency_scale)
+            return decode(value)
+        start = time.perf_counter()
+        result = await fn()
+        self._store(key, kind, encode(result), time.perf_counter() - start)
+        return result
+
+    def stats(self) -> dict:
+        return {"mode": self.mode, "recorded": self.recorded, "replayed": self.replayed}
+
+
+def open_cassette(path: Optional[str], mode: str = "auto", latency_scale: float = 0.0) -> Optional[Cassette]:
+    """Cassette di `path`, atau None bila path kosong atau mode 'off'."""
+    if not path or mode == "off":
+        return None
+    return Cassette(path, mode, latency_scale)
@@ -0,0 +1,268 @@
+"""
+Tahap parse & chunk untuk ingestion. Modul ini sengaja bebas efek samping
+(tanpa klien Qdrant/Gemini) supaya bisa di-import oleh worker process pool.
+
+Markdown dibaca baris per baris dalam satu lintasan: front matter, heading,
+list, tabel dan blok kode dikenali, markup inline dibuang, dan setiap blok
+teks dicatat bersama jalur heading-nya (mis. "UKRI > Pimpinan"). Chunk tidak
+pernah melewati batas bagian heading dan ukurannya diukur dalam token.
+"""
+import hashlib
+import html
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import islice
+
+try:
+    import tiktoken
+    HAS_TIKTOKEN = True
+except ImportError:
+    HAS_TIKTOKEN = False
+
+HEADING_SEPARATOR = " > "
+
+_encoding = None
+
+
+def count_tokens(text):
+    """
+    Jumlah token teks. SDK Gemini yang dipakai belum punya tokenizer offline,
+    jadi dipakai BPE cl100k (tiktoken) sebagai pendekatan; tanpa tiktoken
+    dipakai perkiraan ~4 karakter per token.
+    """
+    global _encoding, HAS_TIKTOKEN
+    if HAS_TIKTOKEN and _encoding is None:
+        try:
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            # File BPE belum ter-cache dan tidak bisa diunduh
+            HAS_TIKTOKEN = False
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return max(1, (len(text) + 3) // 4)
+
+
+_HEADING_RE = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+_LIST_RE = re.compile(r"^\s*(?:[-*+]|\d+[.)])\s+(.*)$")
+_RULE_RE = re.compile(r"^\s*(?:[-*_]\s*){3,}$")
+_TABLE_SEPARATOR_RE = re.compile(r"^\s*\|?\s*:?-{2,}:?\s*(\|\s*:?-{2,}:?\s*)*\|?\s*$")
+_IMAGE_RE = re.compile(r"!\[([^\]]*)\]\([^)]*\)")
+_LINK_RE = re.compile(r"\[([^\]]*)\]\([^)]*\)")
+_HTML_TAG_RE = re.compile(r"<[^>]+>")
+_EMPHASIS_RE = re.compile(r"(\*\*|__|\*|_|~~|`)(?=\S)(.+?)(?<=\S)\1")
+_SPACES_RE = re.compile(r"[ \t]+")
+
+
+def strip_inline(text):
+    """Buang markup inline: gambar, link, tag HTML, penekanan dan kode inline."""
+    text = _IMAGE_RE.sub("", text)
+    text = _LINK_RE.sub(lambda m: m.group(1), text)
+    text = _HTML_TAG_RE.sub("", text)
+    text = _EMPHASIS_RE.sub(lambda m: m.group(2), text)
+    text = html.unescape(text)
+    return _SPACES_RE.sub(" ", text).strip()
+
+
+def parse_front_matter(lines):
+    """Kembalikan (metadata, index baris pertama setelah front matter)."""
+    if not lines or lines[0].strip() != "---":
+        return {}, 0
+    meta = {}
+    for i in range(1, len(lines)):
+        line = lines[i].strip()
+        if line == "---":
+            return meta, i + 1
+        key, sep, value = line.partition(":")
+        if sep:
+            meta[key.strip()] = value.strip().strip('"').strip("'")
+    # Tidak ada penutup: anggap bukan front matter
+    return {}, 0
+
+
+def parse_markdown(md_text):
+    """
+    Satu lintasan atas Markdown. Mengembalikan (front_matter, blocks) dengan
+    blocks berupa list (heading_path, text) tanpa markup.
+    """
+    lines = md_text.splitlines()
+    meta, start = parse_front_matter(lines)
+
+    blocks = []
+    headings = []
+    current = []
+    in_code = False
+
+    def flush():
+        text = "\n".join(line for line in current if line)
+        if text:
+            blocks.append((HEADING_SEPARATOR.join(headings), text))
+        current.clear()
+
+    for raw in lines[start:]:
+        stripped = raw.strip()
+        if stripped.startswith("```") or stripped.startswith("~~~"):
+            if in_code:
+                flush()
+            in_code = not in_code
+            continue
+        if in_code:
+            current.append(raw.rstrip())
+            continue
+
+        if not stripped:
+            flush()
+            continue
+
+        heading = _HEADING_RE.match(stripped)
+        if heading:
+            flush()
+            level = len(heading.group(1))
+            del headings[level - 1:]
+            # Level yang dilewati (mis. # lalu ###) tidak membuat entri kosong
+            title = strip_inline(heading.group(2))
+            if title:
+                headings.append(title)
+            continue
+
+        if _RULE_RE.match(stripped):
+            flush()
+            continue
+        if _TABLE_SEPARATOR_RE.match(stripped) and "|" in stripped:
+            continue
+        if stripped.startswith("|"):
+            cells = [strip_inline(c) for c in stripped.strip("|").split("|")]
+            current.append(" | ".join(c for c in cells if c))
+            continue
+
+        item = _LIST_RE.match(raw)
+        if item:
+            text = strip_inline(item.group(1))
+            if text:
+                current.append(f"- {text}")
+            continue
+
+        current.append(strip_inline(stripped.lstrip(">").strip()))
+
+    flush()
+    return meta, blocks
+
+
+def _split_long_block(text, max_tokens):
+    """Pecah satu blok yang melebihi `max_tokens` per kalimat (atau per kata bila perlu)."""
+    pieces = re.split(r"(?<=[.!?])\s+|\n", text)
+    parts, current, current_tokens = [], [], 0
+    for piece in pieces:
+        piece_tokens = count_tokens(piece)
+        if piece_tokens > max_tokens:
+            words = piece.split()
+            step = max(1, len(words) * max_tokens // piece_tokens)
+            sub_pieces = [" ".join(words[i:i + step]) for i in range(0, len(words), step)]
+        else:
+            sub_pieces = [piece]
+        for sub in sub_pieces:
+            sub_tokens = count_tokens(sub)
+            if current and current_tokens + sub_tokens > max_tokens:
+                parts.append(" ".join(current))
+                current, current_tokens = [], 0
+            current.append(sub)
+            current_tokens += sub_tokens
+    if current:
+        parts.append(" ".join(current))
+    return parts
+
+
+def _tail(text, max_tokens):
+    """Kata-kata terakhir `text` yang muat dalam `max_tokens` token."""
+    tail = []
+    for word in reversed(text.split()):
+        if count_tokens(" ".join([word] + tail)) > max_tokens:
+            break
+        tail.insert(0, word)
+    return " ".join(tail)
+
+
+def chunk_blocks(blocks, max_tokens=300, overlap_tokens=50):
+    """
+    Susun blok menjadi chunk <= `max_tokens` token per bagian heading. Akhir
+    chunk sebelumnya (hingga `overlap_tokens`: blok utuh, lalu potongan kata
+    terakhir dari blok yang tidak muat) diulang di awal chunk berikutnya dalam
+    bagian yang sama. Mengembalikan list dict {"text", "heading"}.
+    """
+    chunks = []
+    current, current_tokens, current_heading = [], 0, None
+
+    def flush():
+        if current:
+            chunks.append({"text": "\n\n".join(t for t, _ in current), "heading": current_heading})
+
+    for heading, text in blocks:
+        tokens = count_tokens(text)
+        pieces = [(text, tokens)] if tokens <= max_tokens else [
+            (p, count_tokens(p)) for p in _split_long_block(text, max_tokens)
+        ]
+        if heading != current_heading:
+            flush()
+            current, current_tokens, current_heading = [], 0, heading
+
+        for piece, piece_tokens in pieces:
+            if current and current_tokens + piece_tokens > max_tokens:
+                flush()
+                # Bawa blok-blok terakhir sebagai overlap; blok yang tidak muat utuh dipotong
+                carry, carry_tokens = [], 0
+                for prev, prev_tokens in reversed(current):
+                    room = min(overlap_tokens, max_tokens - piece_tokens) - carry_tokens
+                    if prev_tokens > room:
+                        tail = _tail(prev, room) if room > 0 else ""
+                        if tail:
+                            carry.insert(0, (tail, count_tokens(tail)))
+                            carry_tokens += carry[0][1]
+                        break
+                    carry.insert(0, (prev, prev_tokens))
+                    carry_tokens += prev_tokens
+                current, current_tokens = carry, carry_tokens
+            current.append((piece, piece_tokens))
+            current_tokens += piece_tokens
+    flush()
+    return chunks
+
+
+def process_markdown_file(path, max_tokens=300, overlap_tokens=50):
+    with open(path, "r", encoding="utf-8") as f:
+        _, blocks = parse_markdown(f.read())
+    return chunk_blocks(blocks, max_tokens, overlap_tokens)
+
+
+def parse_file(path, max_tokens=300, overlap_tokens=50):
+    """Baca, hash, dan chunk satu file. Dipanggil di worker process."""
+    with open(path, "rb") as f:
+        raw = f.read()
+    file_hash = hashlib.sha256(raw).hexdigest()
+    meta, blocks = parse_markdown(raw.decode("utf-8"))
+    return path, file_hash, meta, chunk_blocks(blocks, max_tokens, overlap_tokens)
+
+
+def iter_parsed_files(files, workers=None, max_tokens=300, overlap_tokens=50):
+    """
+    Hasil parse_file untuk setiap file, berurutan sesuai `files`. Dengan
+    workers > 1 parsing berjalan di process pool; jumlah file yang sedang
+    diproses dibatasi agar hasil tidak menumpuk di memori.
+    """
+    parse = partial(parse_file, max_tokens=max_tokens, overlap_tokens=overlap_tokens)
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1:
+        for path in files:
+            yield parse(path)
+        return
+
+    window = workers * 4
+    files = iter(files)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = [pool.submit(parse, path) for path in islice(files, window)]
+        while pending:
+            result = pending.pop(0).result()
+            next_path = next(files, None)
+            if next_path is not None:
+                pending.append(pool.submit(parse, next_path))
+            yield result
@@ -0,0 +1,89 @@
+"""
+Penyusunan konteks untuk model realtime: buang chunk yang hampir duplikat,
+urutkan dengan MMR agar hasilnya beragam, lalu kemas di bawah anggaran token.
+"""
+import math
+import os
+from dataclasses import dataclass
+
+RAG_CONTEXT_TOKEN_BUDGET = int(os.getenv("RAG_CONTEXT_TOKEN_BUDGET", "1200"))
+RAG_CONTEXT_DEDUP_THRESHOLD = float(os.getenv("RAG_CONTEXT_DEDUP_THRESHOLD", "0.8"))
+RAG_CONTEXT_MMR_LAMBDA = float(os.getenv("RAG_CONTEXT_MMR_LAMBDA", "0.7"))
+
+
+def estimate_tokens(text: str) -> int:
+    # Perkiraan kasar ~4 karakter per token; cukup untuk menjaga anggaran
+    return max(1, math.ceil(len(text) / 4))
+
+
+def truncate_to_budget(text: str, token_budget: int) -> str:
+    """Potong `text` di batas kata agar perkiraan tokennya <= `token_budget`."""
+    limit = token_budget * 4
+    if len(text) <= limit:
+        return text
+    cut = text[:limit]
+    space = cut.rfind(" ")
+    return (cut[:space] if space > 0 else cut).rstrip()
+
+
+def shingles(text: str, n: int = 3) -> frozenset:
+    words = text.casefold().split()
+    if len(words) < n:
+        return frozenset([tuple(words)])
+    return frozenset(tuple(words[i:i + n]) for i in range(len(words) - n + 1))
+
+
+def jaccard(a: frozenset, b: frozenset) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+@dataclass
+class _Candidate:
+    text: str
+    relevance: float
+    shingles: frozenset
+    tokens: int
+
+
+def assemble_context(
+    chunks: list[str],
+    token_budget: int = RAG_CONTEXT_TOKEN_BUDGET,
+    dedup_threshold: float = RAG_CONTEXT_DEDUP_THRESHOLD,
+    mmr_lambda: float = RAG_CONTEXT_MMR_LAMBDA,
+) -> list[str]:
+    """
+    `chunks` diurutkan dari yang paling relevan. Mengembalikan subset chunk
+    dalam urutan MMR yang total perkiraan tokennya <= `token_budget`. Chunk
+    pertama yang sendirian melebihi anggaran dipotong, bukan dilewati, agar
+    konteks tidak pernah kosong hanya karena chunk teratas terlalu panjang.
+    """
+    candidates: list[_Candidate] = []
+    for rank, text in enumerate(chunks):
+        text = text.strip()
+        if not text:
+            continue
+        sh = shingles(text)
+        if any(jaccard(sh, c.shingles) >= dedup_threshold for c in candidates):
+            continue
+        relevance = 1.0 - rank / len(chunks)
+        candidates.append(_Candidate(text, relevance, sh, estimate_tokens(text)))
+
+    selected: list[_Candidate] = []
+    used = 0
+    while candidates:
+        best = max(
+            candidates,
+            key=lambda c: mmr_lambda * c.relevance
+            - (1 - mmr_lambda) * max((jaccard(c.shingles, s.shingles) for s in selected), default=0.0),
+        )
+        candidates.remove(best)
+        if not selected and best.tokens > token_budget:
+            best.text = truncate_to_budget(best.text, token_budget)
+            best.tokens = estimate_tokens(best.text)
+        if used + best.tokens > token_budget:
+            continue
+        selected.append(best)
+        used += best.tokens
+    return [c.text for c in selected]
@@ -0,0 +1,85 @@
+"""
+Deteksi near-duplicate dengan MinHash + LSH untuk ingestion. Crawl di ./data
+banyak berisi halaman kembar (mis. data/FE menyalin halaman fasos.ukri.ac.id
+dari data/FASOS), jadi dokumen dan chunk yang hampir sama dilebur sebelum
+di-embed.
+"""
+import zlib
+from typing import Optional
+
+import numpy as np
+
+_MERSENNE_PRIME = (1 << 31) - 1
+
+
+def shingle_hashes(text: str, n: int = 3) -> np.ndarray:
+    words = text.casefold().split()
+    if len(words) < n:
+        grams = [" ".join(words)]
+    else:
+        grams = [" ".join(words[i:i + n]) for i in range(len(words) - n + 1)]
+    return np.fromiter(
+        (zlib.crc32(g.encode("utf-8")) % _MERSENNE_PRIME for g in set(grams)),
+        dtype=np.uint64,
+    )
+
+
+class NearDuplicateIndex:
+    """
+    Indeks LSH atas signature MinHash. `add()` mengembalikan key item yang
+    sudah ada bila teks baru diperkirakan punya Jaccard >= `threshold`
+    dengannya; bila tidak, teks disimpan sebagai item kanonik baru.
+    """
+
+    def __init__(self, threshold: float = 0.9, num_perm: int = 64, bands: int = 16, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm harus habis dibagi bands")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, _MERSENNE_PRIME, size=num_perm).astype(np.uint64)
+        self._b = rng.randint(0, _MERSENNE_PRIME, size=num_perm).astype(np.uint64)
+        self._buckets: dict[tuple, list] = {}
+        self._signatures: dict = {}
+
+    def signature(self, text: str) -> np.ndarray:
+        hashes = shingle_hashes(text)
+        if not hashes.size:
+            return np.zeros(len(self._a), dtype=np.uint64)
+        # (a*h + b) mod p untuk setiap permutasi; nilai < 2^62 jadi aman di uint64
+        permuted = (self._a[:, None] * hashes[None, :] + self._b[:, None]) % _MERSENNE_PRIME
+        return permuted.min(axis=1)
+
+    def _band_keys(self, signature: np.ndarray):
+        for band in range(self.bands):
+            rows = signature[band * self.rows:(band + 1) * self.rows]
+            yield (band, rows.tobytes())
+
+    def find(self, text: str, signature: Optional[np.ndarray] = None):
+        """Key item kanonik yang mirip dengan `text`, atau None."""
+        signature = self.signature(text) if signature is None else signature
+        best_key, best_score = None, self.threshold
+        seen = set()
+        for band_key in self._band_keys(signature):
+            for key in self._buckets.get(band_key, ()):
+                if key in seen:
+                    continue
+                seen.add(key)
+                score = float(np.mean(self._signatures[key] == signature))
+                if score >= best_score:
+                    best_key, best_score = key, score
+        return best_key
+
+    def add(self, key, text: str):
+        signature = self.signature(text)
+        duplicate_of = self.find(text, signature)
+        if duplicate_of is not None:
+            return duplicate_of
+        self._signatures[key] = signature
+        for band_key in self._band_keys(signature):
+            self._buckets.setdefault(band_key, []).append(key)
+        return None
+
+    def __len__(self) -> int:
+        return len(self._signatures)
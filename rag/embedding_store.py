@@ -0,0 +1,133 @@
+"""
+Penyimpanan embedding content-addressed yang dipakai bersama oleh ingestion
+(preprocesing.py), retrieval (rag/search.py) dan harness evaluasi
+(test/test.py). Key-nya sha256 dari (model, task_type, teks), sehingga teks
+yang tidak berubah tidak pernah di-embed dua kali, termasuk saat koleksi
+dibangun ulang dari nol.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from typing import Callable, Optional, Sequence
+
+RAG_EMBED_STORE_PATH = os.getenv("RAG_EMBED_STORE_PATH", "./index/embeddings.sqlite")
+
+
+def content_key(text: str, model: str, task_type: str) -> str:
+    raw = f"{model}\x1f{task_type}\x1f{text}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class EmbeddingStore:
+    """
+    Tabel SQLite (key -> vektor float32). Mode WAL membuat agent, ingestion
+    dan evaluasi bisa membuka file yang sama secara bersamaan.
+    """
+
+    # Batas parameter per statement SQLite
+    _LOOKUP_CHUNK = 500
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, model TEXT NOT NULL, task_type TEXT NOT NULL, "
+            "vector BLOB NOT NULL, created REAL NOT NULL)"
+        )
+        self._db.commit()
+
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(
+        self, texts: Sequence[str], model: str, task_type: str, max_age: float = 0.0
+    ) -> list[Optional[list[float]]]:
+        """Vektor untuk setiap teks, atau None bila belum ada (atau lebih tua dari `max_age` detik)."""
+        keys = [content_key(t, model, task_type) for t in texts]
+        found = {}
+        with self._lock:
+            unique = list(dict.fromkeys(keys))
+            for i in range(0, len(unique), self._LOOKUP_CHUNK):
+                part = unique[i:i + self._LOOKUP_CHUNK]
+                rows = self._db.execute(
+                    f"SELECT key, vector, created FROM embeddings WHERE key IN ({','.join('?' * len(part))})",
+                    part,
+                ).fetchall()
+                for key, blob, created in rows:
+                    if max_age > 0 and time.time() - created > max_age:
+                        continue
+                    found[key] = array("f", blob).tolist()
+            vectors = [found.get(k) for k in keys]
+            hits = sum(v is not None for v in vectors)
+            self.hits += hits
+            self.misses += len(vectors) - hits
+        return vectors
+
+    def get(self, text: str, model: str, task_type: str, max_age: float = 0.0) -> Optional[list[float]]:
+        return self.get_many([text], model, task_type, max_age)[0]
+
+    def put_many(self, texts: Sequence[str], model: str, task_type: str, vectors: Sequence[Sequence[float]]) -> None:
+        created = time.time()
+        rows = [
+            (content_key(t, model, task_type), model, task_type, array("f", v).tobytes(), created)
+            for t, v in zip(texts, vectors)
+        ]
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, model, task_type, vector, created) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._db.commit()
+
+    def put(self, text: str, model: str, task_type: str, vector: Sequence[float]) -> None:
+        self.put_many([text], model, task_type, [vector])
+
+    def embed(
+        self,
+        texts: Sequence[str],
+        model: str,
+        task_type: str,
+        embed_fn: Callable[[list[str]], list[list[float]]],
+    ) -> list[list[float]]:
+        """
+        Baca lewat store: hanya teks yang belum tersimpan (tanpa duplikat)
+        yang dikirim ke `embed_fn`, lalu hasilnya disimpan.
+        """
+        vectors = self.get_many(texts, model, task_type)
+        missing = list(dict.fromkeys(t for t, v in zip(texts, vectors) if v is None))
+        if not missing:
+            return vectors
+        fresh = dict(zip(missing, embed_fn(missing)))
+        self.put_many(missing, model, task_type, [fresh[t] for t in missing])
+        return [v if v is not None else fresh[t] for t, v in zip(texts, vectors)]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM embeddings")
+            self._db.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+def open_store(path: Optional[str] = None) -> Optional[EmbeddingStore]:
+    """Store di `path` (default RAG_EMBED_STORE_PATH); string kosong mematikan store."""
+    path = RAG_EMBED_STORE_PATH if path is None else path
+    return EmbeddingStore(path) if path else None
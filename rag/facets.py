@@ -0,0 +1,67 @@
+"""
+Field payload terstruktur (fakultas & hostname) untuk filtered search, plus
+deteksi fakultas berbasis kata kunci dari query pengguna.
+
+Filter direpresentasikan sebagai dict field -> nilai (atau list nilai), mis.
+{"faculty": "FIKSI"}; rag/search.py menerjemahkannya ke filter Qdrant,
+sedangkan indeks lokal dan BM25 memakai `matches_filters`.
+"""
+import os
+import re
+from typing import Optional
+from urllib.parse import urlparse
+
+# Dokumen di root ./data berlaku untuk seluruh universitas
+UNIVERSITY = "UKRI"
+
+# Hanya singkatan dan nama lengkap fakultas: nama prodi atau kata umum
+# ("manajemen", "perencanaan") juga muncul di dokumen fakultas lain dan
+# akan mempersempit query yang sebenarnya umum
+FACULTY_KEYWORDS = {
+    "FIKSI": ("fiksi", "fakultas ilmu komputer dan sistem informasi"),
+    "FTI": ("fti", "fakultas teknologi industri"),
+    "FTSP": ("ftsp", "fakultas teknik sipil dan perencanaan"),
+    "FASOS": ("fasos", "fakultas ilmu sosial dan sastra"),
+    "FE": ("fe", "fakultas ekonomi"),
+}
+
+_FACULTY_PATTERNS = {
+    faculty: re.compile(r"\b(?:" + "|".join(re.escape(k) for k in keywords) + r")\b")
+    for faculty, keywords in FACULTY_KEYWORDS.items()
+}
+
+
+def faculty_from_source(source: str) -> str:
+    """'FIKSI/fiksi.ukri.ac.id_.md' -> 'FIKSI'; file di root data -> 'UKRI'."""
+    head = os.path.normpath(source).split(os.sep)[0]
+    return head.upper() if head != os.path.basename(source) else UNIVERSITY
+
+
+def faculties_from_sources(sources) -> list[str]:
+    return sorted({faculty_from_source(s) for s in sources})
+
+
+def hostname_from_url(url: Optional[str]) -> Optional[str]:
+    if not url:
+        return None
+    return urlparse(url).hostname
+
+
+def detect_faculty(query: str) -> Optional[str]:
+    """Fakultas yang disebut di query, atau None bila tidak ada / lebih dari satu."""
+    text = query.casefold()
+    found = [faculty for faculty, pattern in _FACULTY_PATTERNS.items() if pattern.search(text)]
+    return found[0] if len(found) == 1 else None
+
+
+def matches_filters(payload: dict, filters: Optional[dict]) -> bool:
+    """True bila setiap field di `filters` cocok; field list di payload cocok bila ada irisan."""
+    if not filters:
+        return True
+    for field, wanted in filters.items():
+        wanted = set(wanted) if isinstance(wanted, (list, tuple, set)) else {wanted}
+        value = payload.get(field)
+        values = set(value) if isinstance(value, list) else {value}
+        if not wanted & values:
+            return False
+    return True
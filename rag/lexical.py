@@ -0,0 +1,165 @@
+"""
+Indeks leksikal BM25 untuk retrieval hybrid. Dibangun dari chunk yang sama
+dengan yang di-embed oleh preprocesing.py dan disimpan di samping snapshot
+vektor (RAG_LOCAL_INDEX_DIR/<koleksi>/bm25.json, lihat rag/build_info.py).
+"""
+import json
+import math
+import os
+import re
+import time
+from collections import Counter, defaultdict
+from typing import Iterable, Optional
+
+from rag.facets import matches_filters
+from rag.local_index import LocalHit
+
+BM25_FILE = "bm25.json"
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+STOPWORDS = frozenset("""
+    ada adalah agar akan aku anda apa apakah atau bagaimana bagi bahwa banyak
+    beberapa belum berapa bisa dalam dan dapat dari dengan di dia ialah ini
+    itu jika juga kami kamu kapan karena ke kenapa kita lagi mana masih mau
+    mereka saat saja sangat saya sebagai sebuah secara sedang sejak seperti
+    siapa sudah tentang tersebut tidak untuk yaitu yang
+    a an and are for in is of on or the to what where who with
+""".split())
+
+# Partikel dan kata ganti milik yang sering menempel pada kata dasar
+_PARTICLES = ("lah", "kah", "tah", "pun")
+_POSSESSIVES = ("nya", "ku", "mu")
+
+
+def _strip_suffix(token: str, suffixes: tuple) -> str:
+    for suffix in suffixes:
+        if token.endswith(suffix) and len(token) - len(suffix) >= 4:
+            return token[: -len(suffix)]
+    return token
+
+
+def tokenize(text: str) -> list[str]:
+    tokens = []
+    for token in _TOKEN_RE.findall(text.casefold()):
+        if token in STOPWORDS:
+            continue
+        if not token.isdigit():
+            token = _strip_suffix(_strip_suffix(token, _PARTICLES), _POSSESSIVES)
+        tokens.append(token)
+    return tokens
+
+
+class BM25Index:
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.ids: list[str] = []
+        self.payloads: list[dict] = []
+        self.doc_len: list[int] = []
+        self.postings: dict[str, list[list[int]]] = {}
+        self.idf: dict[str, float] = {}
+        self.avgdl = 0.0
+        self.built_at = 0.0
+
+    def add(self, doc_id: str, text: str, payload: dict) -> None:
+        """Tambah satu dokumen; panggil finalize() setelah dokumen terakhir."""
+        counts = Counter(tokenize(text))
+        doc_idx = len(self.ids)
+        self.ids.append(str(doc_id))
+        self.payloads.append(payload)
+        self.doc_len.append(sum(counts.values()))
+        for term, tf in counts.items():
+            self.postings.setdefault(term, []).append([doc_idx, tf])
+
+    def finalize(self) -> None:
+        self.built_at = time.time()
+        self._finalize()
+
+    @classmethod
+    def build(cls, docs: Iterable[tuple[str, str, dict]], k1: float = 1.5, b: float = 0.75) -> "BM25Index":
+        """`docs` berisi tuple (point_id, text, payload)."""
+        index = cls(k1=k1, b=b)
+        for doc_id, text, payload in docs:
+            index.add(doc_id, text, payload)
+        index.finalize()
+        return index
+
+    def _finalize(self) -> None:
+        n = len(self.ids)
+        self.avgdl = sum(self.doc_len) / n if n else 0.0
+        self.idf = {
+            term: math.log(1 + (n - len(plist) + 0.5) / (len(plist) + 0.5))
+            for term, plist in self.postings.items()
+        }
+
+    @property
+    def version(self) -> str:
+        return f"bm25:{self.built_at}"
+
+    def search(self, query: str, top_k: int = 5, filters: Optional[dict] = None) -> list[LocalHit]:
+        if not self.ids or top_k <= 0:
+            return []
+        allowed = None
+        if filters:
+            allowed = {i for i, payload in enumerate(self.payloads) if matches_filters(payload, filters)}
+        scores: dict[int, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            plist = self.postings.get(term)
+            if not plist:
+                continue
+            idf = self.idf[term]
+            for doc_idx, tf in plist:
+                if allowed is not None and doc_idx not in allowed:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * self.doc_len[doc_idx] / self.avgdl)
+                scores[doc_idx] += idf * tf * (self.k1 + 1) / (tf + norm)
+
+        best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+        return [LocalHit(self.ids[i], score, self.payloads[i]) for i, score in best]
+
+    def save(self, index_dir: str) -> str:
+        os.makedirs(index_dir, exist_ok=True)
+        path = os.path.join(index_dir, BM25_FILE)
+        data = {
+            "k1": self.k1,
+            "b": self.b,
+            "built_at": self.built_at,
+            "ids": self.ids,
+            "payloads": self.payloads,
+            "doc_len": self.doc_len,
+            "postings": self.postings,
+        }
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(path + ".tmp", path)
+        return path
+
+    @classmethod
+    def load(cls, index_dir: str) -> Optional["BM25Index"]:
+        path = os.path.join(index_dir, BM25_FILE)
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        index = cls(k1=data["k1"], b=data["b"])
+        index.built_at = data["built_at"]
+        index.ids = data["ids"]
+        index.payloads = data["payloads"]
+        index.doc_len = data["doc_len"]
+        index.postings = data["postings"]
+        index._finalize()
+        return index
+
+
+def reciprocal_rank_fusion(result_lists: list[list], top_k: int, k: int = 60) -> list:
+    """Gabungkan beberapa daftar hit (yang punya `.id`) dengan reciprocal rank fusion."""
+    scores: dict[str, float] = defaultdict(float)
+    first_hit = {}
+    for hits in result_lists:
+        for rank, hit in enumerate(hits):
+            key = str(hit.id)
+            scores[key] += 1.0 / (k + rank + 1)
+            first_hit.setdefault(key, hit)
+    ranked = sorted(scores, key=scores.get, reverse=True)[:top_k]
+    return [first_hit[key] for key in ranked]
@@ -0,0 +1,185 @@
+"""
+Backend pencarian vektor in-process. Snapshot koleksi Qdrant disimpan sebagai
+matriks .npy (float32/float16, sudah dinormalisasi) yang dibuka dengan mmap,
+plus file payload JSONL. Pencarian top-k cukup satu perkalian matriks-vektor.
+
+Ekspor snapshot:
+    python -m rag.local_index --out ./index --dtype float16
+"""
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+import numpy as np
+
+from rag.facets import matches_filters
+
+VECTORS_FILE = "vectors.npy"
+PAYLOADS_FILE = "payloads.jsonl"
+META_FILE = "meta.json"
+
+
+@dataclass
+class LocalHit:
+    id: str
+    score: float
+    payload: dict = field(default_factory=dict)
+
+
+def export_snapshot(client, collection: str, out_dir: str, dtype: str = "float32", batch_size: int = 256) -> dict:
+    """Salin semua point koleksi ke `out_dir` dalam format yang bisa di-mmap."""
+    ids, vectors, payloads = [], [], []
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=collection,
+            limit=batch_size,
+            offset=offset,
+            with_payload=True,
+            with_vectors=True,
+        )
+        for p in points:
+            ids.append(str(p.id))
+            vectors.append(p.vector)
+            payloads.append(p.payload or {})
+        if offset is None:
+            break
+
+    matrix = np.asarray(vectors, dtype=np.float32)
+    if matrix.size:
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        matrix = matrix / norms
+
+    os.makedirs(out_dir, exist_ok=True)
+    # Tulis ke file sementara lalu rename supaya worker tidak membuka snapshot setengah jadi
+    tmp_vectors = os.path.join(out_dir, VECTORS_FILE + ".tmp")
+    with open(tmp_vectors, "wb") as f:
+        np.save(f, matrix.astype(dtype))
+    tmp_payloads = os.path.join(out_dir, PAYLOADS_FILE + ".tmp")
+    with open(tmp_payloads, "w", encoding="utf-8") as f:
+        for point_id, payload in zip(ids, payloads):
+            f.write(json.dumps({"id": point_id, "payload": payload}, ensure_ascii=False) + "\n")
+
+    meta = {
+        "collection": collection,
+        "count": len(ids),
+        "dim": int(matrix.shape[1]) if matrix.ndim == 2 else 0,
+        "dtype": dtype,
+        "exported_at": time.time(),
+    }
+    tmp_meta = os.path.join(out_dir, META_FILE + ".tmp")
+    with open(tmp_meta, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+
+    os.replace(tmp_vectors, os.path.join(out_dir, VECTORS_FILE))
+    os.replace(tmp_payloads, os.path.join(out_dir, PAYLOADS_FILE))
+    os.replace(tmp_meta, os.path.join(out_dir, META_FILE))
+    return meta
+
+
+class LocalIndex:
+    def __init__(self, matrix: np.ndarray, ids: list[str], payloads: list[dict], meta: dict):
+        self.matrix = matrix
+        self.ids = ids
+        self.payloads = payloads
+        self.meta = meta
+        # Baris yang lolos filter, per filter (korpus statis selama snapshot dibuka)
+        self._filter_rows: dict[str, np.ndarray] = {}
+
+    @classmethod
+    def load(cls, index_dir: str) -> "LocalIndex":
+        with open(os.path.join(index_dir, META_FILE), encoding="utf-8") as f:
+            meta = json.load(f)
+        matrix = np.load(os.path.join(index_dir, VECTORS_FILE), mmap_mode="r")
+        ids, payloads = [], []
+        with open(os.path.join(index_dir, PAYLOADS_FILE), encoding="utf-8") as f:
+            for line in f:
+                row = json.loads(line)
+                ids.append(row["id"])
+                payloads.append(row["payload"])
+        return cls(matrix, ids, payloads, meta)
+
+    @property
+    def version(self) -> str:
+        return f"local:{self.meta.get('collection')}:{self.meta.get('exported_at')}"
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @staticmethod
+    def _normalize_rows(vectors) -> np.ndarray:
+        queries = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return queries / norms
+
+    def _top_hits(self, scores: np.ndarray, top_k: int, rows: Optional[np.ndarray] = None) -> list[LocalHit]:
+        k = min(top_k, len(scores))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        if rows is not None:
+            return [LocalHit(self.ids[rows[i]], float(scores[i]), self.payloads[rows[i]]) for i in top]
+        return [LocalHit(self.ids[i], float(scores[i]), self.payloads[i]) for i in top]
+
+    def _filtered_rows(self, filters: dict) -> np.ndarray:
+        key = repr(sorted(filters.items()))
+        rows = self._filter_rows.get(key)
+        if rows is None:
+            rows = np.array(
+                [i for i, payload in enumerate(self.payloads) if matches_filters(payload, filters)], dtype=np.int64
+            )
+            self._filter_rows[key] = rows
+        return rows
+
+    def search(self, vector, top_k: int = 5, filters: Optional[dict] = None) -> list[LocalHit]:
+        return self.search_batch([vector], top_k, filters)[0]
+
+    def search_batch(self, vectors, top_k: int = 5, filters: Optional[dict] = None) -> list[list[LocalHit]]:
+        """Top-k untuk banyak query sekaligus dengan satu perkalian matriks."""
+        if not len(vectors):
+            return []
+        if not self.ids or top_k <= 0:
+            return [[] for _ in vectors]
+        queries = self._normalize_rows(vectors)
+        if filters:
+            # Hanya baris yang lolos filter yang dihitung skornya
+            rows = self._filtered_rows(filters)
+            scores = np.asarray(self.matrix[rows] @ queries.T, dtype=np.float32)
+            return [self._top_hits(scores[:, j], top_k, rows) for j in range(scores.shape[1])]
+        # Snapshot float16 di-upcast per panggilan: hemat memori, sedikit lebih lambat
+        scores = np.asarray(self.matrix @ queries.T, dtype=np.float32)
+        return [self._top_hits(scores[:, j], top_k) for j in range(scores.shape[1])]
+
+
+def load_local_index(index_dir: str) -> Optional[LocalIndex]:
+    if not os.path.exists(os.path.join(index_dir, META_FILE)):
+        return None
+    return LocalIndex.load(index_dir)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from dotenv import load_dotenv
+    from qdrant_client import QdrantClient
+
+    from rag.aliases import alias_target
+
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Ekspor koleksi Qdrant ke snapshot lokal")
+    parser.add_argument("--out", default=os.getenv("RAG_LOCAL_INDEX_DIR", "./index"))
+    parser.add_argument("--collection", default=os.getenv("QDRANT_COLLECTION", "nara_documents"))
+    parser.add_argument("--dtype", choices=["float32", "float16"], default="float32")
+    args = parser.parse_args()
+
+    qdrant = QdrantClient(url=os.getenv("QDRANT_URL"), api_key=os.getenv("QDRANT_API_KEY"))
+    # Simpan nama koleksi fisik agar BM25 & build id yang dipakai sesuai snapshot ini
+    collection = alias_target(qdrant, args.collection) or args.collection
+    meta = export_snapshot(qdrant, collection, args.out, dtype=args.dtype)
+    print(f"✅ Snapshot {meta['count']} vektor ({meta['dim']} dim, {meta['dtype']}) disimpan di {args.out}")
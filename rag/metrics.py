@@ -0,0 +1,183 @@
+"""
+Metrik latensi retrieval per tahap (embed, pencarian vektor, ekstraksi payload,
+format hasil) dalam format teks OpenMetrics. Setiap proses job LiveKit punya
+registry sendiri, jadi ekspor dilakukan lewat textfile per proses
+(mis. untuk node_exporter textfile collector) dengan label `pid`.
+"""
+import atexit
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+# Batas bucket histogram dalam detik
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class LatencyHistogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS, reservoir_size: int = 2048):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.total = 0.0
+        # Sampel terakhir untuk menghitung p50/p95/p99
+        self.samples = deque(maxlen=reservoir_size)
+
+    def observe(self, seconds: float) -> None:
+        self.count += 1
+        self.total += seconds
+        self.samples.append(seconds)
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                self.counts[i] += 1
+                break
+
+    def quantile(self, q: float) -> float:
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class RetrievalMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms: dict[str, LatencyHistogram] = defaultdict(LatencyHistogram)
+        self.errors: dict[str, int] = defaultdict(int)
+        self.requests = 0
+        self.empty_results = 0
+        # Statistik cache (hit/miss, ukuran) per nama, dibaca saat render
+        self._cache_stats: dict[str, Callable[[], dict]] = {}
+        self._writer: Optional[threading.Thread] = None
+        self._textfile: Optional[str] = None
+        self._stopped = threading.Event()
+
+    def register_cache(self, name: str, stats: Callable[[], dict]) -> None:
+        """Ekspor nilai numerik dari `stats()` sebagai gauge rag_cache_<kunci>{cache=name}."""
+        self._cache_stats[name] = stats
+
+    def observe(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self.histograms[stage].observe(seconds)
+
+    @contextmanager
+    def span(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            with self._lock:
+                self.errors[stage] += 1
+            raise
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def record_request(self, result_count: int) -> None:
+        with self._lock:
+            self.requests += 1
+            if result_count == 0:
+                self.empty_results += 1
+
+    def summary(self) -> dict:
+        """Ringkasan p50/p95/p99 (milidetik) per tahap, untuk log."""
+        with self._lock:
+            return {
+                stage: {f"p{int(q * 100)}": round(h.quantile(q) * 1000, 2) for q in QUANTILES}
+                for stage, h in self.histograms.items()
+            }
+
+    def render_openmetrics(self) -> str:
+        pid = os.getpid()
+        lines = [
+            "# TYPE rag_stage_latency_seconds histogram",
+            "# HELP rag_stage_latency_seconds Latensi tiap tahap retrieval.",
+        ]
+        with self._lock:
+            for stage, h in sorted(self.histograms.items()):
+                labels = f'stage="{stage}",pid="{pid}"'
+                cumulative = 0
+                for bound, count in zip(h.buckets, h.counts):
+                    cumulative += count
+                    lines.append(f'rag_stage_latency_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'rag_stage_latency_seconds_bucket{{{labels},le="+Inf"}} {h.count}')
+                lines.append(f"rag_stage_latency_seconds_sum{{{labels}}} {h.total}")
+                lines.append(f"rag_stage_latency_seconds_count{{{labels}}} {h.count}")
+
+            lines.append("# TYPE rag_stage_latency_quantile_seconds gauge")
+            lines.append("# HELP rag_stage_latency_quantile_seconds p50/p95/p99 dari sampel terakhir.")
+            for stage, h in sorted(self.histograms.items()):
+                for q in QUANTILES:
+                    lines.append(
+                        f'rag_stage_latency_quantile_seconds{{stage="{stage}",pid="{pid}",quantile="{q}"}} '
+                        f"{h.quantile(q)}"
+                    )
+
+            lines.append("# TYPE rag_stage_errors counter")
+            for stage, count in sorted(self.errors.items()):
+                lines.append(f'rag_stage_errors_total{{stage="{stage}",pid="{pid}"}} {count}')
+            lines.append("# TYPE rag_requests counter")
+            lines.append(f'rag_requests_total{{pid="{pid}"}} {self.requests}')
+            lines.append("# TYPE rag_empty_results counter")
+            lines.append(f'rag_empty_results_total{{pid="{pid}"}} {self.empty_results}')
+
+        # Di luar lock: stats() cache mengambil lock miliknya sendiri
+        by_key: dict[str, list[str]] = defaultdict(list)
+        for name, stats in sorted(self._cache_stats.items()):
+            for key, value in sorted(stats().items()):
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    by_key[key].append(f'rag_cache_{key}{{cache="{name}",pid="{pid}"}} {value}')
+        for key, samples in sorted(by_key.items()):
+            lines.append(f"# TYPE rag_cache_{key} gauge")
+            lines.extend(samples)
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path: str) -> None:
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.render_openmetrics())
+        os.replace(tmp_path, path)
+
+    def start_textfile_writer(self, path: str, interval: float = 15.0) -> None:
+        """
+        Tulis metrik ke `path` setiap `interval` detik. `path` wajib memuat
+        `{pid}` (diganti pid proses) karena setiap proses job menulis file
+        sendiri; file dihapus saat proses keluar agar collector tidak terus
+        membaca metrik proses yang sudah mati.
+        """
+        if self._writer is not None:
+            return
+        if "{pid}" not in path:
+            raise ValueError(f"Path textfile metrik harus memuat {{pid}}: {path}")
+        self._textfile = path = path.format(pid=os.getpid())
+
+        def _loop():
+            while not self._stopped.is_set():
+                try:
+                    self.write_textfile(path)
+                except OSError:
+                    pass
+                self._stopped.wait(interval)
+
+        self._writer = threading.Thread(target=_loop, name="rag-metrics-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.stop_textfile_writer)
+
+    def stop_textfile_writer(self) -> None:
+        """Hentikan writer dan hapus textfile proses ini."""
+        if self._writer is None:
+            return
+        self._stopped.set()
+        self._writer.join(timeout=1.0)
+        self._writer = None
+        for path in (self._textfile, f"{self._textfile}.tmp"):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+retrieval_metrics = RetrievalMetrics()
@@ -0,0 +1,68 @@
+"""
+Opsi kuantisasi & penyimpanan koleksi Qdrant. Dipakai preprocesing.py saat
+membuat koleksi dan rag/search.py untuk parameter pencarian yang sesuai;
+bench/quantization.py mengukur recall/memori/latensi tiap konfigurasi.
+
+    RAG_QUANTIZATION      none | scalar (int8) | binary
+    RAG_VECTORS_ON_DISK   true: vektor asli float32 di disk (mmap), hanya
+                          vektor terkuantisasi yang selalu di RAM
+    RAG_HNSW_ON_DISK      true: graf HNSW juga di disk
+    RAG_RESCORE           true: kandidat hasil kuantisasi di-rescore dengan vektor asli
+    RAG_OVERSAMPLING      kelipatan kandidat yang diambil sebelum rescore
+    RAG_HNSW_EF           ef saat pencarian (kosong = default Qdrant)
+"""
+import os
+from typing import Optional
+
+from qdrant_client.models import (
+    BinaryQuantization,
+    BinaryQuantizationConfig,
+    HnswConfigDiff,
+    QuantizationSearchParams,
+    ScalarQuantization,
+    ScalarQuantizationConfig,
+    ScalarType,
+    SearchParams,
+)
+
+QUANTIZATION_MODES = ("none", "scalar", "binary")
+
+RAG_QUANTIZATION = os.getenv("RAG_QUANTIZATION", "none").lower()
+RAG_VECTORS_ON_DISK = os.getenv("RAG_VECTORS_ON_DISK", "false").lower() == "true"
+RAG_HNSW_ON_DISK = os.getenv("RAG_HNSW_ON_DISK", "false").lower() == "true"
+RAG_RESCORE = os.getenv("RAG_RESCORE", "true").lower() == "true"
+RAG_OVERSAMPLING = float(os.getenv("RAG_OVERSAMPLING", "2.0"))
+RAG_HNSW_EF = int(os.getenv("RAG_HNSW_EF", "0")) or None
+
+if RAG_QUANTIZATION not in QUANTIZATION_MODES:
+    raise ValueError(f"RAG_QUANTIZATION harus salah satu dari {QUANTIZATION_MODES}, bukan '{RAG_QUANTIZATION}'")
+
+
+def quantization_config(mode: str = RAG_QUANTIZATION):
+    """Config kuantisasi untuk create_collection; vektor terkuantisasi selalu di RAM."""
+    if mode == "scalar":
+        return ScalarQuantization(
+            scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99, always_ram=True)
+        )
+    if mode == "binary":
+        return BinaryQuantization(binary=BinaryQuantizationConfig(always_ram=True))
+    return None
+
+
+def hnsw_config(on_disk: bool = RAG_HNSW_ON_DISK) -> Optional[HnswConfigDiff]:
+    return HnswConfigDiff(on_disk=True) if on_disk else None
+
+
+def search_params(
+    mode: str = RAG_QUANTIZATION,
+    rescore: bool = RAG_RESCORE,
+    oversampling: float = RAG_OVERSAMPLING,
+    hnsw_ef: Optional[int] = RAG_HNSW_EF,
+) -> Optional[SearchParams]:
+    """SearchParams yang cocok dengan `mode`; None bila tidak ada yang perlu diubah."""
+    if mode == "none" and hnsw_ef is None:
+        return None
+    quantization = None
+    if mode != "none":
+        quantization = QuantizationSearchParams(ignore=False, rescore=rescore, oversampling=oversampling)
+    return SearchParams(hnsw_ef=hnsw_ef, quantization=quantization)
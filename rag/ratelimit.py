@@ -0,0 +1,108 @@
+import asyncio
+import re
+import threading
+import time
+from typing import Optional
+
+
+class TokenBucket:
+    """
+    Token bucket thread-safe untuk membatasi laju request ke API (mis. kuota
+    Gemini per menit). `acquire()` memblok sampai token cukup tersedia.
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else max(1.0, self.rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, tokens: float = 1.0) -> None:
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def drain(self) -> None:
+        """Kosongkan bucket, mis. setelah menerima 429 agar semua worker ikut menahan diri."""
+        with self._lock:
+            self._refill()
+            self._tokens = 0.0
+
+
+def is_rate_limited(error: BaseException) -> bool:
+    return "429" in str(error) or "ResourceExhausted" in type(error).__name__
+
+
+def retry_delay(error: BaseException, default: float) -> float:
+    """Jeda yang disarankan server di pesan error 429 (retry_delay { seconds: N }), bila ada."""
+    match = re.search(r"retry_delay\s*\{\s*seconds:\s*(\d+)", str(error))
+    return float(match.group(1)) if match else default
+
+
+class AsyncQuotaLimiter:
+    """
+    Kuota request per menit (RPM) dan token per menit (TPM) untuk coroutine.
+    Pemanggil dilayani FIFO; `penalize()` setelah 429 menahan semua pemanggil
+    sampai jeda berakhir, jadi runner bergerak tepat di plafon kuota.
+    """
+
+    def __init__(self, rpm: float, tpm: Optional[float] = None):
+        self._request_rate = rpm / 60.0
+        self._request_capacity = max(1.0, self._request_rate)
+        self._requests = self._request_capacity
+        self._token_rate = tpm / 60.0 if tpm else None
+        self._token_capacity = max(1.0, self._token_rate) if self._token_rate else None
+        self._tokens = self._token_capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+        self.throttled = 0
+        self.waited_seconds = 0.0
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._requests = min(self._request_capacity, self._requests + elapsed * self._request_rate)
+        if self._token_rate:
+            self._tokens = min(self._token_capacity, self._tokens + elapsed * self._token_rate)
+        self._updated = now
+
+    async def acquire(self, tokens: float = 0.0) -> None:
+        async with self._lock:
+            if self._token_rate:
+                # Request yang lebih besar dari kapasitas tetap boleh lewat setelah bucket penuh
+                tokens = min(tokens, self._token_capacity)
+            while True:
+                self._refill()
+                wait = max(
+                    self._paused_until - time.monotonic(),
+                    (1.0 - self._requests) / self._request_rate,
+                    (tokens - self._tokens) / self._token_rate if self._token_rate else 0.0,
+                )
+                if wait <= 0:
+                    self._requests -= 1.0
+                    if self._token_rate:
+                        self._tokens -= tokens
+                    return
+                self.waited_seconds += wait
+                await asyncio.sleep(wait)
+
+    def penalize(self, seconds: float) -> None:
+        """Tahan semua request selama `seconds` detik (mis. setelah 429) dan kosongkan bucket."""
+        self.throttled += 1
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._requests = 0.0
+        if self._token_rate:
+            self._tokens = 0.0
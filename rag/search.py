@@ -1,7 +1,21 @@
+import asyncio
+import json
 import os
+import time
+from typing import Optional
 from dotenv import load_dotenv
-from qdrant_client import QdrantClient
-from google.generativeai import configure, embed_content
+from qdrant_client import AsyncQdrantClient, QdrantClient
+from qdrant_client.models import FieldCondition, Filter, MatchAny, SearchRequest
+from google.generativeai import configure, embed_content, embed_content_async
+from rag.aliases import alias_target, alias_target_async
+from rag.build_info import collection_dir, read_build_id
+from rag.cache import EmbeddingCache, SemanticResultCache
+from rag.embedding_store import open_store
+from rag.facets import UNIVERSITY, detect_faculty
+from rag.lexical import BM25_FILE, BM25Index, reciprocal_rank_fusion
+from rag.local_index import LocalIndex, load_local_index
+from rag.metrics import retrieval_metrics
+from rag.quantization import search_params
 
 load_dotenv()
 
@@ -9,21 +23,502 @@ configure(api_key=os.getenv("GOOGLE_API_KEY"))
 
 QDRANT_URL = os.getenv("QDRANT_URL")
 QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
+# Alias yang dipindahkan oleh reindex blue/green (rag/aliases.py); nama koleksi biasa juga bisa
 QDRANT_COLLECTION = os.getenv("QDRANT_COLLECTION", "nara_documents")
+EMBEDDING_MODEL = "models/embedding-001"
+# Batas jumlah teks per request batchEmbedContents
+EMBED_BATCH_SIZE = 100
+# Batas jumlah pencarian async yang berjalan bersamaan per proses worker
+RAG_MAX_CONCURRENCY = int(os.getenv("RAG_MAX_CONCURRENCY", "4"))
+RAG_EMBED_CACHE_SIZE = int(os.getenv("RAG_EMBED_CACHE_SIZE", "1024"))
+RAG_EMBED_CACHE_TTL = float(os.getenv("RAG_EMBED_CACHE_TTL", "86400"))
+# Cache hasil berbasis kemiripan query; ukuran 0 mematikan cache
+RAG_RESULT_CACHE_SIZE = int(os.getenv("RAG_RESULT_CACHE_SIZE", "256"))
+RAG_RESULT_CACHE_THRESHOLD = float(os.getenv("RAG_RESULT_CACHE_THRESHOLD", "0.95"))
+# Seberapa sering (detik) versi koleksi dicek ulang ke Qdrant
+RAG_COLLECTION_VERSION_TTL = float(os.getenv("RAG_COLLECTION_VERSION_TTL", "60"))
+
+# "qdrant" (default) atau "local" untuk snapshot NumPy in-process (lihat rag/local_index.py)
+RAG_SEARCH_BACKEND = os.getenv("RAG_SEARCH_BACKEND", "qdrant").lower()
+RAG_LOCAL_INDEX_DIR = os.getenv("RAG_LOCAL_INDEX_DIR", "./index")
+# Retrieval hybrid BM25 + vektor, aktif bila RAG_LOCAL_INDEX_DIR/<koleksi>/bm25.json tersedia
+RAG_HYBRID = os.getenv("RAG_HYBRID", "1") == "1"
+RAG_HYBRID_OVERSAMPLE = int(os.getenv("RAG_HYBRID_OVERSAMPLE", "3"))
+RAG_RRF_K = int(os.getenv("RAG_RRF_K", "60"))
+# Filter fakultas otomatis dari kata kunci di query (lihat rag/facets.py)
+RAG_AUTO_FILTER = os.getenv("RAG_AUTO_FILTER", "1") == "1"
+RAG_WARMUP_QUERY = os.getenv("RAG_WARMUP_QUERY", "Universitas Kebangsaan Republik Indonesia")
 
 client = QdrantClient(url=QDRANT_URL, api_key=QDRANT_API_KEY)
+async_client = AsyncQdrantClient(url=QDRANT_URL, api_key=QDRANT_API_KEY)
+
+_search_semaphore = asyncio.Semaphore(RAG_MAX_CONCURRENCY)
+# Parameter pencarian sesuai kuantisasi koleksi (RAG_QUANTIZATION, RAG_RESCORE, ...)
+SEARCH_PARAMS = search_params()
+
+embedding_cache = EmbeddingCache(
+    max_size=RAG_EMBED_CACHE_SIZE,
+    ttl=RAG_EMBED_CACHE_TTL,
+    # Store embedding bersama ingestion & evaluasi; RAG_EMBED_STORE_PATH="" untuk in-memory saja
+    store=open_store(),
+)
+result_cache = SemanticResultCache(
+    max_size=RAG_RESULT_CACHE_SIZE,
+    threshold=RAG_RESULT_CACHE_THRESHOLD,
+)
+
+_collection_version = None
+_collection_version_checked = 0.0
+# Koleksi fisik di balik alias saat versi terakhir dicek
+_collection_target = None
+_local_index = None
+_bm25_index = None
+_bm25_loaded = False
+_bm25_collection = None
+_bm25_mtime = None
+_bm25_checked = 0.0
+
+
+def _extract_texts(hits) -> list[str]:
+    return [hit.payload["text"] for hit in hits if "text" in hit.payload]
 
-def search_docs(query: str, top_k: int = 5) -> list[str]:
+
+def embed_query(query: str) -> list[float]:
+    embedding = embedding_cache.get(query, EMBEDDING_MODEL, "RETRIEVAL_QUERY")
+    if embedding is not None:
+        return embedding
+
+    start = time.perf_counter()
     embedding = embed_content(
         content=query,
         task_type="RETRIEVAL_QUERY",
-        model="models/embedding-001"
+        model=EMBEDDING_MODEL
     )["embedding"]
+    embedding_cache.put(query, EMBEDDING_MODEL, "RETRIEVAL_QUERY", embedding, time.perf_counter() - start)
+    return embedding
+
+
+async def embed_query_async(query: str) -> list[float]:
+    embedding = await embedding_cache.get_async(query, EMBEDDING_MODEL, "RETRIEVAL_QUERY")
+    if embedding is not None:
+        return embedding
+
+    start = time.perf_counter()
+    embedding = (await embed_content_async(
+        content=query,
+        task_type="RETRIEVAL_QUERY",
+        model=EMBEDDING_MODEL
+    ))["embedding"]
+    embedding_cache.put_async(query, EMBEDDING_MODEL, "RETRIEVAL_QUERY", embedding, time.perf_counter() - start)
+    return embedding
+
+
+def embed_queries(queries: list[str]) -> list[list[float]]:
+    """Embed banyak query dengan sesedikit mungkin request; yang sudah ada di cache dilewati."""
+    embeddings = [embedding_cache.get(q, EMBEDDING_MODEL, "RETRIEVAL_QUERY") for q in queries]
+    missing = list(dict.fromkeys(q for q, e in zip(queries, embeddings) if e is None))
+
+    fresh = {}
+    for i in range(0, len(missing), EMBED_BATCH_SIZE):
+        batch = missing[i:i + EMBED_BATCH_SIZE]
+        start = time.perf_counter()
+        vectors = embed_content(
+            content=batch,
+            task_type="RETRIEVAL_QUERY",
+            model=EMBEDDING_MODEL
+        )["embedding"]
+        elapsed = (time.perf_counter() - start) / len(batch)
+        for q, vector in zip(batch, vectors):
+            embedding_cache.put(q, EMBEDDING_MODEL, "RETRIEVAL_QUERY", vector, elapsed)
+            fresh[q] = vector
+
+    return [e if e is not None else fresh[q] for q, e in zip(queries, embeddings)]
+
+
+def embedding_cache_stats() -> dict:
+    return embedding_cache.stats()
+
+
+def result_cache_stats() -> dict:
+    return result_cache.stats()
+
+
+# Hit/miss kedua cache ikut diekspor bersama metrik latensi (RAG_METRICS_TEXTFILE)
+retrieval_metrics.register_cache("embedding", embedding_cache_stats)
+retrieval_metrics.register_cache("result", result_cache_stats)
+
+
+def get_local_index() -> LocalIndex:
+    """Buka snapshot lokal sekali per proses; dipanggil saat worker start."""
+    global _local_index
+    if _local_index is None:
+        _local_index = load_local_index(RAG_LOCAL_INDEX_DIR)
+        if _local_index is None:
+            raise RuntimeError(
+                f"Snapshot lokal tidak ditemukan di {RAG_LOCAL_INDEX_DIR}; "
+                "jalankan `python -m rag.local_index` terlebih dahulu."
+            )
+    return _local_index
+
+
+def _use_local_index() -> bool:
+    return RAG_SEARCH_BACKEND == "local"
+
+
+def _version_is_fresh() -> bool:
+    return (
+        _collection_version is not None
+        and time.monotonic() - _collection_version_checked < RAG_COLLECTION_VERSION_TTL
+    )
+
+
+def _set_collection_version(target: Optional[str], info) -> str:
+    """
+    Catat koleksi di balik alias dan versinya. Koleksi fisik ikut dalam versi
+    agar swap/rollback selalu membuang cache hasil; build id koleksi tersebut
+    menandai perubahan isi, jumlah point hanya cadangan bila build id belum ada.
+    """
+    global _collection_version, _collection_version_checked, _collection_target
+    _collection_target = target or QDRANT_COLLECTION
+    build_id = read_build_id(RAG_LOCAL_INDEX_DIR, _collection_target)
+    _collection_version = f"{_collection_target}:{build_id or info.points_count}"
+    _collection_version_checked = time.monotonic()
+    return _collection_version
+
+
+def collection_version() -> str:
+    """Versi koleksi (nama + build id), di-cache selama RAG_COLLECTION_VERSION_TTL detik."""
+    if _use_local_index():
+        return get_local_index().version
+    if _version_is_fresh():
+        return _collection_version
+    target = alias_target(client, QDRANT_COLLECTION)
+    return _set_collection_version(target, client.get_collection(QDRANT_COLLECTION))
+
+
+async def collection_version_async() -> str:
+    if _use_local_index():
+        return get_local_index().version
+    if _version_is_fresh():
+        return _collection_version
+    target = await alias_target_async(async_client, QDRANT_COLLECTION)
+    info = await async_client.get_collection(QDRANT_COLLECTION)
+    return _set_collection_version(target, info)
+
+
+def _index_collection() -> str:
+    """Koleksi fisik yang sedang dilayani, untuk memilih artefak di RAG_LOCAL_INDEX_DIR."""
+    if _use_local_index():
+        return get_local_index().meta.get("collection") or QDRANT_COLLECTION
+    return _collection_target or QDRANT_COLLECTION
+
+
+def _bm25_file_mtime(index_dir: str) -> Optional[float]:
+    try:
+        return os.stat(os.path.join(index_dir, BM25_FILE)).st_mtime
+    except OSError:
+        return None
+
+
+def get_bm25_index():
+    """
+    Indeks BM25 milik koleksi yang sedang ditunjuk alias, atau None bila belum
+    dibangun. Indeks dimuat ulang begitu alias pindah (swap/rollback); selain
+    itu mtime file dicek setiap RAG_COLLECTION_VERSION_TTL detik sehingga RRF
+    tidak memakai payload lama.
+    """
+    global _bm25_index, _bm25_loaded, _bm25_collection, _bm25_mtime, _bm25_checked
+    collection = _index_collection()
+    now = time.monotonic()
+    if _bm25_loaded and collection == _bm25_collection and now - _bm25_checked < RAG_COLLECTION_VERSION_TTL:
+        return _bm25_index
+    _bm25_checked = now
+    index_dir = collection_dir(RAG_LOCAL_INDEX_DIR, collection)
+    mtime = _bm25_file_mtime(index_dir)
+    if not _bm25_loaded or collection != _bm25_collection or mtime != _bm25_mtime:
+        _bm25_index = BM25Index.load(index_dir)
+        _bm25_collection = collection
+        _bm25_mtime = mtime
+        _bm25_loaded = True
+    return _bm25_index
+
+
+def _hybrid_enabled() -> bool:
+    return RAG_HYBRID and get_bm25_index() is not None
+
+
+def _search_version(base: str, hybrid: bool) -> str:
+    return f"{base}|{get_bm25_index().version}" if hybrid else base
+
+
+def resolve_filters(query: str, filters: Optional[dict] = None) -> Optional[dict]:
+    """
+    Filter payload untuk satu query. Filter eksplisit dipakai apa adanya
+    ({} berarti tanpa filter); None berarti deteksi fakultas otomatis.
+    Filter otomatis tetap menyertakan dokumen tingkat universitas (UKRI).
+    """
+    if filters is not None:
+        return filters or None
+    if RAG_AUTO_FILTER:
+        faculty = detect_faculty(query)
+        if faculty:
+            return {"faculty": [faculty, UNIVERSITY]}
+    return None
+
 
-    hits = client.search(
+def _qdrant_filter(filters: Optional[dict]) -> Optional[Filter]:
+    if not filters:
+        return None
+    return Filter(must=[
+        FieldCondition(key=field, match=MatchAny(any=list(value) if isinstance(value, (list, tuple, set)) else [value]))
+        for field, value in filters.items()
+    ])
+
+
+def _filter_scope(filters: Optional[dict]) -> Optional[str]:
+    """Scope entri result cache untuk sebuah filter (None = tanpa filter)."""
+    return json.dumps(filters, sort_keys=True) if filters else None
+
+
+def _vector_search(embedding: list[float], limit: int, filters: Optional[dict] = None):
+    if _use_local_index():
+        return get_local_index().search(embedding, limit, filters)
+    return client.search(
         collection_name=QDRANT_COLLECTION,
         query_vector=embedding,
-        limit=top_k,
+        query_filter=_qdrant_filter(filters),
+        search_params=SEARCH_PARAMS,
+        limit=limit,
     )
 
-    return [hit.payload["text"] for hit in hits if "text" in hit.payload]
+
+async def _vector_search_async(embedding: list[float], limit: int, filters: Optional[dict] = None):
+    if _use_local_index():
+        return get_local_index().search(embedding, limit, filters)
+    return await async_client.search(
+        collection_name=QDRANT_COLLECTION,
+        query_vector=embedding,
+        query_filter=_qdrant_filter(filters),
+        search_params=SEARCH_PARAMS,
+        limit=limit,
+    )
+
+
+def _vector_search_batch(embeddings: list[list[float]], limit: int, filters: Optional[list] = None) -> list:
+    filters = filters or [None] * len(embeddings)
+    if _use_local_index():
+        if not any(filters):
+            return get_local_index().search_batch(embeddings, limit)
+        return [get_local_index().search(e, limit, f) for e, f in zip(embeddings, filters)]
+    return client.search_batch(
+        collection_name=QDRANT_COLLECTION,
+        requests=[
+            SearchRequest(vector=e, filter=_qdrant_filter(f), params=SEARCH_PARAMS, limit=limit, with_payload=True)
+            for e, f in zip(embeddings, filters)
+        ],
+    )
+
+
+def warmup() -> dict:
+    """
+    Muat indeks lokal, buka koneksi ke Qdrant dan Gemini, lalu jalankan satu
+    embed + search tanpa cache. Mengembalikan durasi tiap tahap dalam detik.
+    """
+    timings = {}
+    start = time.perf_counter()
+    if not _use_local_index():
+        target = alias_target(client, QDRANT_COLLECTION)
+        _set_collection_version(target, client.get_collection(QDRANT_COLLECTION))
+    timings["connect"] = time.perf_counter() - start
+
+    # Setelah alias diketahui, agar BM25 yang dimuat milik koleksi yang dilayani
+    start = time.perf_counter()
+    if _use_local_index():
+        get_local_index()
+    get_bm25_index()
+    timings["indexes"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    embedding = embed_content(
+        content=RAG_WARMUP_QUERY,
+        task_type="RETRIEVAL_QUERY",
+        model=EMBEDDING_MODEL
+    )["embedding"]
+    timings["embed"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    _vector_search(embedding, 1)
+    timings["search"] = time.perf_counter() - start
+    return timings
+
+
+async def warmup_async() -> dict:
+    """Seperti warmup() untuk klien async yang terikat ke event loop job."""
+    timings = {}
+    start = time.perf_counter()
+    if not _use_local_index():
+        target = await alias_target_async(async_client, QDRANT_COLLECTION)
+        info = await async_client.get_collection(QDRANT_COLLECTION)
+        _set_collection_version(target, info)
+    timings["connect"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    embedding = (await embed_content_async(
+        content=RAG_WARMUP_QUERY,
+        task_type="RETRIEVAL_QUERY",
+        model=EMBEDDING_MODEL
+    ))["embedding"]
+    timings["embed"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    await _vector_search_async(embedding, 1)
+    timings["search"] = time.perf_counter() - start
+    return timings
+
+
+def _lexical_search(query: str, limit: int, filters: Optional[dict] = None) -> list:
+    with retrieval_metrics.span("lexical_search"):
+        return get_bm25_index().search(query, limit, filters)
+
+
+def _retrieve(query, embedding, top_k, limit, hybrid, filters, lexical_hits=None) -> list:
+    with retrieval_metrics.span("vector_search"):
+        hits = _vector_search(embedding, limit, filters)
+        if hybrid:
+            if lexical_hits is None:
+                lexical_hits = _lexical_search(query, limit, filters)
+            hits = reciprocal_rank_fusion([hits, lexical_hits], top_k, k=RAG_RRF_K)
+    return hits
+
+
+async def _retrieve_async(query, embedding, top_k, limit, hybrid, filters, lexical_hits=None) -> list:
+    with retrieval_metrics.span("vector_search"):
+        hits = await _vector_search_async(embedding, limit, filters)
+        if hybrid:
+            if lexical_hits is None:
+                lexical_hits = await asyncio.to_thread(_lexical_search, query, limit, filters)
+            hits = reciprocal_rank_fusion([hits, lexical_hits], top_k, k=RAG_RRF_K)
+    return hits
+
+
+def search_docs(query: str, top_k: int = 5, filters: Optional[dict] = None) -> list[str]:
+    """
+    Top-k teks chunk untuk `query`. `filters` membatasi payload, mis.
+    {"faculty": "FIKSI"}; tanpa filter eksplisit fakultas dideteksi dari
+    query. Bila filter tidak menyisakan hasil, pencarian diulang tanpa filter.
+    """
+    with retrieval_metrics.span("total"):
+        filters = resolve_filters(query, filters)
+        # Versi dicek dulu: alias yang pindah menentukan indeks BM25 yang dipakai
+        base_version = collection_version()
+        hybrid = _hybrid_enabled()
+        limit = top_k * RAG_HYBRID_OVERSAMPLE if hybrid else top_k
+        lexical_hits = _lexical_search(query, limit, filters) if hybrid else None
+
+        with retrieval_metrics.span("embed"):
+            embedding = embed_query(query)
+        version = _search_version(base_version, hybrid)
+        scope = _filter_scope(filters)
+        results = result_cache.get(embedding, top_k, version, scope)
+        if results is None:
+            hits = _retrieve(query, embedding, top_k, limit, hybrid, filters, lexical_hits)
+            if not hits and filters:
+                hits = _retrieve(query, embedding, top_k, limit, hybrid, None)
+            with retrieval_metrics.span("extract"):
+                results = _extract_texts(hits)
+            result_cache.put(embedding, top_k, results, version, scope)
+
+    retrieval_metrics.record_request(len(results))
+    return results
+
+
+async def search_docs_async(query: str, top_k: int = 5, filters: Optional[dict] = None) -> list[str]:
+    """Versi non-blocking dari search_docs untuk dipakai di dalam event loop."""
+    with retrieval_metrics.span("total"):
+        async with _search_semaphore:
+            filters = resolve_filters(query, filters)
+            base_version = await collection_version_async()
+            hybrid = _hybrid_enabled()
+            limit = top_k * RAG_HYBRID_OVERSAMPLE if hybrid else top_k
+            with retrieval_metrics.span("embed"):
+                if hybrid:
+                    # BM25 berjalan di thread selama embedding menunggu jaringan
+                    embedding, lexical_hits = await asyncio.gather(
+                        embed_query_async(query),
+                        asyncio.to_thread(_lexical_search, query, limit, filters),
+                    )
+                else:
+                    embedding, lexical_hits = await embed_query_async(query), None
+
+            version = _search_version(base_version, hybrid)
+            scope = _filter_scope(filters)
+            results = result_cache.get(embedding, top_k, version, scope)
+            if results is None:
+                hits = await _retrieve_async(query, embedding, top_k, limit, hybrid, filters, lexical_hits)
+                if not hits and filters:
+                    hits = await _retrieve_async(query, embedding, top_k, limit, hybrid, None)
+
+        if results is None:
+            with retrieval_metrics.span("extract"):
+                results = _extract_texts(hits)
+            result_cache.put(embedding, top_k, results, version, scope)
+
+    retrieval_metrics.record_request(len(results))
+    return results
+
+
+def _search_hits_batch(queries, embeddings, query_filters, top_k: int, hybrid: bool) -> list[list]:
+    limit = top_k * RAG_HYBRID_OVERSAMPLE if hybrid else top_k
+    with retrieval_metrics.span("vector_search_batch"):
+        hit_lists = _vector_search_batch(embeddings, limit, query_filters)
+    results = []
+    for query, embedding, filters, hits in zip(queries, embeddings, query_filters, hit_lists):
+        if hybrid:
+            lexical_hits = _lexical_search(query, limit, filters)
+            hits = reciprocal_rank_fusion([hits, lexical_hits], top_k, k=RAG_RRF_K)
+        if not hits and filters:
+            hits = _retrieve(query, embedding, top_k, limit, hybrid, None)
+        results.append(hits)
+    return results
+
+
+def search_hits_batch(queries: list[str], top_k: int = 5, filters: Optional[dict] = None) -> list[list]:
+    """
+    Hit lengkap (id, score, payload) per query dengan pipeline yang sama
+    seperti search_docs_batch, tanpa result cache. Dipakai evaluasi
+    retrieval (test/retrieval_eval.py).
+    """
+    if not queries:
+        return []
+    query_filters = [resolve_filters(q, filters) for q in queries]
+    collection_version()
+    return _search_hits_batch(queries, embed_queries(queries), query_filters, top_k, _hybrid_enabled())
+
+
+def search_docs_batch(queries: list[str], top_k: int = 5, filters: Optional[dict] = None) -> list[list[str]]:
+    """
+    Seperti search_docs untuk banyak query: semua embedding dalam request batch
+    dan semua pencarian vektor dalam satu panggilan search_batch.
+    """
+    if not queries:
+        return []
+    base_version = collection_version()
+    hybrid = _hybrid_enabled()
+    query_filters = [resolve_filters(q, filters) for q in queries]
+
+    embeddings = embed_queries(queries)
+    version = _search_version(base_version, hybrid)
+    scopes = [_filter_scope(f) for f in query_filters]
+    results = [result_cache.get(e, top_k, version, scope) for e, scope in zip(embeddings, scopes)]
+    pending = [i for i, r in enumerate(results) if r is None]
+    if not pending:
+        return results
+
+    hit_lists = _search_hits_batch(
+        [queries[i] for i in pending], [embeddings[i] for i in pending],
+        [query_filters[i] for i in pending], top_k, hybrid,
+    )
+    for i, hits in zip(pending, hit_lists):
+        results[i] = _extract_texts(hits)
+        result_cache.put(embeddings[i], top_k, results[i], version, scopes[i])
+    return results
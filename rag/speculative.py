@@ -0,0 +1,117 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Optional
+
+from rag.lexical import tokenize
+
+
+def query_overlap(query: str, utterance: str) -> float:
+    """Porsi token query tool yang juga muncul di ucapan pengguna."""
+    query_tokens = set(tokenize(query))
+    if not query_tokens:
+        return 0.0
+    return len(query_tokens & set(tokenize(utterance))) / len(query_tokens)
+
+
+def _consume_result(task: asyncio.Task) -> None:
+    # Hindari log "Task exception was never retrieved" untuk hasil yang tidak terpakai
+    if not task.cancelled():
+        task.exception()
+
+
+class SpeculativeRetriever:
+    """
+    Menjalankan retrieval lebih awal dari transkrip interim pengguna. Ucapan yang
+    sudah stabil selama `stable_delay` detik (atau transkrip final) memicu
+    pencarian; ucapan yang lebih baru membatalkan pencarian sebelumnya. Saat
+    tool `retrieve_info` dipanggil, `take()` mengembalikan hasil spekulatif bila
+    query tool cukup mirip dengan ucapan tersebut.
+    """
+
+    def __init__(
+        self,
+        search_fn: Callable[[str, int], Awaitable[list[str]]],
+        top_k: int = 5,
+        stable_delay: float = 0.3,
+        min_overlap: float = 0.6,
+        max_age: float = 15.0,
+    ):
+        self._search_fn = search_fn
+        self.top_k = top_k
+        self.stable_delay = stable_delay
+        self.min_overlap = min_overlap
+        self.max_age = max_age
+
+        self._candidate: Optional[str] = None
+        self._debounce: Optional[asyncio.TimerHandle] = None
+        self._query: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+        self._started_at = 0.0
+
+        self.started = 0
+        self.cancelled = 0
+        self.used = 0
+        self.missed = 0
+
+    def on_transcript(self, transcript: str, is_final: bool) -> None:
+        text = transcript.strip()
+        if not text or (text == self._candidate and not is_final):
+            return
+        self._candidate = text
+        if self._debounce is not None:
+            self._debounce.cancel()
+        delay = 0.0 if is_final else self.stable_delay
+        self._debounce = asyncio.get_running_loop().call_later(delay, self._start, text)
+
+    def _start(self, text: str) -> None:
+        self._debounce = None
+        if self._task is not None and self._query == text:
+            return
+        self._cancel_task()
+        self._query = text
+        self._started_at = time.monotonic()
+        self._task = asyncio.create_task(self._search_fn(text, self.top_k))
+        self._task.add_done_callback(_consume_result)
+        self.started += 1
+
+    def _cancel_task(self) -> None:
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            self.cancelled += 1
+        self._task = None
+
+    async def take(self, query: str) -> Optional[list[str]]:
+        """Hasil spekulatif untuk `query`, atau None bila tidak ada yang cocok."""
+        task, utterance = self._task, self._query
+        if (
+            task is None
+            or task.cancelled()
+            or time.monotonic() - self._started_at > self.max_age
+            or query_overlap(query, utterance) < self.min_overlap
+        ):
+            self.missed += 1
+            return None
+
+        # Lepas dari self._task agar transkrip berikutnya tidak membatalkannya
+        self._task = None
+        try:
+            results = await task
+        except Exception:
+            self.missed += 1
+            return None
+        self.used += 1
+        return results
+
+    def close(self) -> None:
+        if self._debounce is not None:
+            self._debounce.cancel()
+            self._debounce = None
+        self._cancel_task()
+
+    def stats(self) -> dict:
+        return {
+            "started": self.started,
+            "cancelled": self.cancelled,
+            "used": self.used,
+            "missed": self.missed,
+        }
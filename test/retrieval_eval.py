@@ -0,0 +1,153 @@
+"""
+Evaluasi retrieval saja (tanpa generasi & judge): recall@k, MRR dan nDCG@k
+untuk beberapa k sekaligus dalam satu kali pencarian batch.
+
+CSV input berisi kolom pertanyaan dan kolom relevan berisi file `source`
+(mis. FIKSI/fiksi.ukri.ac.id_.md) dan/atau id chunk, dipisah "|":
+
+    pertanyaan,relevan
+    "Apa saja prodi di FIKSI?","FIKSI/fiksi.ukri.ac.id_.md|FIKSI/fiksi.ukri.ac.id_prodi.md"
+
+    python test/retrieval_eval.py --csv test/retrieval.csv --k 1 3 5 10
+    RAG_SEARCH_BACKEND=local python test/retrieval_eval.py --csv test/retrieval.csv
+
+Sebuah hit relevan bila id-nya, `source`, atau salah satu `sources`-nya ada
+di label. Setiap label dihitung sekali: recall@k = label yang ditemukan di
+top-k / jumlah label, nDCG memakai gain biner per label.
+"""
+import csv
+import json
+import math
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# Modul rag/ ada di root repo
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from rag.search import search_hits_batch
+
+LABEL_SEPARATOR = "|"
+QUESTION_COLUMNS = ("pertanyaan", "question", "query")
+LABEL_COLUMNS = ("relevan", "relevant", "sources", "source", "chunk_ids")
+# Jumlah query per panggilan search_hits_batch (satu request embedding + satu search_batch)
+BATCH_SIZE = 64
+
+# ======================================================================
+# Data & metrik
+# ======================================================================
+
+def read_labelled_cases(path: str) -> List[Dict]:
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        lower = {c.lower(): c for c in reader.fieldnames or []}
+        qcol = next((lower[c] for c in QUESTION_COLUMNS if c in lower), None)
+        lcol = next((lower[c] for c in LABEL_COLUMNS if c in lower), None)
+        if qcol is None or lcol is None:
+            raise ValueError(f"'{path}' harus punya kolom pertanyaan ({'/'.join(QUESTION_COLUMNS)}) "
+                             f"dan kolom relevan ({'/'.join(LABEL_COLUMNS)}).")
+        cases = []
+        for row in reader:
+            q = (row.get(qcol) or "").strip()
+            labels = [l.strip() for l in (row.get(lcol) or "").split(LABEL_SEPARATOR) if l.strip()]
+            if q and labels:
+                cases.append({"q": q, "labels": labels})
+    return cases
+
+
+def hit_labels(hit, labels: set) -> set:
+    """Label yang dipenuhi oleh sebuah hit (id chunk, source, atau sources)."""
+    payload = hit.payload or {}
+    keys = {str(hit.id), payload.get("source"), *payload.get("sources", [])}
+    return labels & keys
+
+
+def score_ranking(hits, labels: List[str], ks: List[int]) -> Dict[str, float]:
+    wanted = set(labels)
+    found = set()
+    # gain[i] = jumlah label baru yang dipenuhi hit ke-i (satu hit kanonis bisa
+    # membawa beberapa `sources`); found_at[i] = label yang ditemukan di top-(i+1)
+    gains, found_at = [], []
+    first_rank = None
+    for rank, hit in enumerate(hits, start=1):
+        new = hit_labels(hit, wanted) - found
+        found |= new
+        gains.append(float(len(new)))
+        found_at.append(len(found))
+        if new and first_rank is None:
+            first_rank = rank
+
+    scores = {"mrr": 1.0 / first_rank if first_rank else 0.0}
+    for k in ks:
+        scores[f"recall@{k}"] = (found_at[min(k, len(found_at)) - 1] if found_at else 0) / len(wanted)
+        dcg = sum(g / math.log2(i + 2) for i, g in enumerate(gains[:k]))
+        # Ideal: setiap posisi memenuhi satu label baru. Hit yang membawa beberapa
+        # label sekaligus bisa melampaui ideal ini, jadi nilainya dibatasi 1.0
+        idcg = sum(1.0 / math.log2(i + 2) for i in range(min(len(wanted), k)))
+        scores[f"ndcg@{k}"] = min(1.0, dcg / idcg)
+    return scores
+
+
+# ======================================================================
+# Runner
+# ======================================================================
+
+def evaluate(cases: List[Dict], ks: List[int], filters: Optional[dict] = None) -> Dict:
+    top_k = max(ks)
+    per_query = []
+    started = time.perf_counter()
+    for start in range(0, len(cases), BATCH_SIZE):
+        batch = cases[start:start + BATCH_SIZE]
+        hit_lists = search_hits_batch([c["q"] for c in batch], top_k=top_k, filters=filters)
+        for case, hits in zip(batch, hit_lists):
+            per_query.append({
+                "pertanyaan": case["q"],
+                "labels": case["labels"],
+                "hits": [str(h.id) for h in hits],
+                **score_ranking(hits, case["labels"], ks),
+            })
+    elapsed = time.perf_counter() - started
+
+    metric_names = ["mrr"] + [f"{m}@{k}" for k in ks for m in ("recall", "ndcg")]
+    summary = {name: sum(r[name] for r in per_query) / len(per_query) for name in metric_names}
+    return {"queries": len(per_query), "seconds": round(elapsed, 2), "summary": summary, "per_query": per_query}
+
+
+def print_report(report: Dict, ks: List[int]) -> None:
+    summary = report["summary"]
+    print(f"{report['queries']} pertanyaan dalam {report['seconds']:.2f} detik")
+    print(f"{'k':>4}{'recall':>10}{'nDCG':>10}")
+    for k in ks:
+        print(f"{k:>4}{summary[f'recall@{k}']:>10.3f}{summary[f'ndcg@{k}']:>10.3f}")
+    print(f"MRR@{max(ks)}: {summary['mrr']:.3f}")
+
+    missed = [r for r in report["per_query"] if r["mrr"] == 0.0]
+    if missed:
+        print(f"\n{len(missed)} pertanyaan tanpa hit relevan di top-{max(ks)}:")
+        for r in missed[:10]:
+            print(f"   - {r['pertanyaan'][:80]}")
+
+
+# ======================================================================
+# Entrypoint
+# ======================================================================
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Evaluasi retrieval (recall@k, MRR, nDCG) tanpa LLM")
+    parser.add_argument("--csv", required=True, help="CSV pertanyaan + kolom relevan (source / id chunk, dipisah '|')")
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 3, 5, 10], help="Nilai k (default: 1 3 5 10)")
+    parser.add_argument("--no-auto-filter", action="store_true", help="Matikan filter fakultas otomatis dari query")
+    parser.add_argument("--output", help="Simpan laporan lengkap (per pertanyaan) sebagai JSON")
+    args = parser.parse_args()
+
+    cases = read_labelled_cases(args.csv)
+    if not cases:
+        raise SystemExit(f"Tidak ada pertanyaan berlabel di '{args.csv}'.")
+    ks = sorted(set(args.k))
+    report = evaluate(cases, ks, filters={} if args.no_auto_filter else None)
+    print_report(report, ks)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Laporan disimpan ke {args.output}")
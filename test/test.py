@@ -1,7 +1,12 @@
 import os
+import sys
 import csv
 import json
 import time
+import asyncio
+import hashlib
+import io
+from collections import Counter
 from datetime import datetime
 from zoneinfo import ZoneInfo
 from pathlib import Path
@@ -15,6 +20,16 @@ from qdrant_client import QdrantClient
 import google.generativeai as genai
 from google.generativeai import configure, embed_content
 
+# Modul rag/ ada di root repo
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import rag.search as rag_search
+from rag.cache import normalize_query
+from rag.cassette import MODES as CASSETTE_MODES, CassetteMiss, open_cassette
+from rag.chunking import count_tokens
+from rag.embedding_store import open_store
+from rag.local_index import LocalHit
+from rag.ratelimit import AsyncQuotaLimiter, is_rate_limited, retry_delay
+
 # ======================================================================
 # Konfigurasi
 # ======================================================================
@@ -30,7 +45,81 @@ QDRANT_COLLECTION = os.getenv("QDRANT_COLLECTION", "nara_documents")
 client = QdrantClient(url=QDRANT_URL, api_key=QDRANT_API_KEY)
 
 # Model generatif
-model = genai.GenerativeModel("gemini-2.0-flash")
+GENERATIVE_MODEL = "gemini-2.0-flash"
+model = genai.GenerativeModel(GENERATIVE_MODEL)
+
+EMBEDDING_MODEL = "models/embedding-001"
+# Store embedding yang sama dengan agent & ingestion: run ulang tidak meng-embed query yang sama lagi
+embed_store = open_store()
+
+# Kuota Gemini untuk mode batch: runner menjadwalkan panggilan tepat di plafon ini
+EVAL_RPM = float(os.getenv("EVAL_RPM", "15"))
+EVAL_TPM = float(os.getenv("EVAL_TPM", "1000000"))
+# Jumlah pertanyaan yang diproses bersamaan
+EVAL_CONCURRENCY = int(os.getenv("EVAL_CONCURRENCY", "8"))
+# Perkiraan token keluaran per panggilan, ikut dihitung ke TPM
+EVAL_OUTPUT_TOKENS = int(os.getenv("EVAL_OUTPUT_TOKENS", "400"))
+EVAL_MAX_RETRIES = int(os.getenv("EVAL_MAX_RETRIES", "5"))
+# Jumlah jawaban kandidat yang dinilai dalam satu prompt judge (1 = satu per prompt)
+EVAL_JUDGE_BATCH = int(os.getenv("EVAL_JUDGE_BATCH", "8"))
+
+# Cassette record/replay untuk Gemini & Qdrant (lihat rag/cassette.py).
+# Replay menjalankan ulang evaluasi tanpa jaringan dan tanpa kuota;
+# EVAL_REPLAY_LATENCY=1 mensimulasikan latensi seperti saat direkam.
+cassette = open_cassette(
+    os.getenv("EVAL_CASSETTE", ""),
+    os.getenv("EVAL_CASSETTE_MODE", "auto"),
+    float(os.getenv("EVAL_REPLAY_LATENCY", "0")),
+)
+
+# ======================================================================
+# Panggilan layanan eksternal (lewat cassette bila aktif)
+# ======================================================================
+
+def _generate_text(prompt: str) -> str:
+    def call() -> str:
+        return getattr(model.generate_content(prompt), "text", "")
+    if cassette is None:
+        return call()
+    return cassette.call("generate", {"model": GENERATIVE_MODEL, "prompt": prompt}, call)
+
+def _embed_stored(query: str) -> List[float]:
+    def _embed(_keys: List[str]) -> List[List[float]]:
+        return [embed_content(content=query, task_type="RETRIEVAL_QUERY", model=EMBEDDING_MODEL)["embedding"]]
+
+    if embed_store is not None:
+        # Kunci sama dengan EmbeddingCache di rag/search.py (query dinormalisasi)
+        return embed_store.embed([normalize_query(query)], EMBEDDING_MODEL, "RETRIEVAL_QUERY", _embed)[0]
+    return _embed([query])[0]
+
+# Lookup store ada di dalam panggilan cassette: embedding dari store ikut direkam,
+# sehingga replay tidak bergantung pada store lokal
+def _embed_query(query: str) -> List[float]:
+    if cassette is None:
+        return _embed_stored(query)
+    request = {"model": EMBEDDING_MODEL, "task_type": "RETRIEVAL_QUERY", "content": query}
+    return cassette.call("embed", request, lambda: _embed_stored(query))
+
+# Vektor di-hash agar key cassette tetap pendek; hasil disimpan sebagai LocalHit
+def _vector_key(embedding: List[float]) -> str:
+    return hashlib.sha256(json.dumps(embedding).encode("utf-8")).hexdigest()
+
+def _encode_hits(hits) -> List[Dict]:
+    return [{"id": str(h.id), "score": h.score, "payload": h.payload} for h in hits]
+
+def _decode_hits(rows: List[Dict]) -> List[LocalHit]:
+    return [LocalHit(**row) for row in rows]
+
+def _qdrant_search(embedding: List[float], top_k: int):
+    def call():
+        return client.search(collection_name=QDRANT_COLLECTION, query_vector=embedding, limit=top_k)
+    if cassette is None:
+        return call()
+    return cassette.call(
+        "search",
+        {"collection": QDRANT_COLLECTION, "vector": _vector_key(embedding), "limit": top_k},
+        call, encode=_encode_hits, decode=_decode_hits,
+    )
 
 # ======================================================================
 # Retrieval ke Qdrant
@@ -40,29 +129,32 @@ def search_docs(query: str, top_k: int = 5) -> List[str]:
     """
     Dapatkan embedding untuk query dan cari dokumen di Qdrant.
     """
-    embedding = embed_content(
-        content=query,
-        task_type="RETRIEVAL_QUERY",
-        model="models/embedding-001"
-    )["embedding"]
-
-    hits = client.search(
-        collection_name=QDRANT_COLLECTION,
-        query_vector=embedding,
-        limit=top_k,
-    )
+    embedding = _embed_query(query)
+    hits = _qdrant_search(embedding, top_k)
 
     return [hit.payload["text"] for hit in hits if "text" in hit.payload]
 
+def _search_docs_batch(queries: List[str], top_k: int = 5) -> List[List[str]]:
+    """
+    Retrieval produksi untuk banyak query (rag.search.search_docs_batch:
+    embedding batch, search_batch, BM25/RRF, filter fakultas & cache hasil).
+    Saat cassette aktif seluruh panggilan direkam sebagai satu entri, jadi
+    replay tidak membutuhkan Qdrant, Gemini, store embedding maupun bm25.json.
+    """
+    def call() -> List[List[str]]:
+        return rag_search.search_docs_batch(queries, top_k)
+    if cassette is None:
+        return call()
+    request = {"collection": QDRANT_COLLECTION, "queries": queries, "top_k": top_k}
+    return cassette.call("search_docs_batch", request, call)
+
 # ======================================================================
 # Generasi jawaban
 # ======================================================================
 
-def ask_rag_ai(query: str, top_k: int = 5) -> str:
-    try:
-        context = search_docs(query, top_k=top_k)
-        joined = "\n\n".join(context) if context else "(Tidak ada konteks yang ditemukan.)"
-        prompt = f"""Anda adalah chatbot AI yang ramah dan membantu bernama Nara. Jawab pertanyaan berikut berdasarkan konteks yang diberikan.
+def _rag_prompt(query: str, context: List[str]) -> str:
+    joined = "\n\n".join(context) if context else "(Tidak ada konteks yang ditemukan.)"
+    return f"""Anda adalah chatbot AI yang ramah dan membantu bernama Nara. Jawab pertanyaan berikut berdasarkan konteks yang diberikan.
 Jawab secara akurat dan informatif dalam bahasa Indonesia.
 
 Konteks:
@@ -71,21 +163,29 @@ Konteks:
 Pertanyaan:
 {query}
 """
-        response = model.generate_content(prompt)
-        return getattr(response, "text", "").strip() or "(Tidak ada teks balasan.)"
-    except Exception as e:
-        return f"Error during RAG AI call: {e}"
 
-def ask_og_ai(query: str) -> str:
-    try:
-        prompt = f"""Anda adalah chatbot AI yang ramah dan membantu bernama Nara. Jawab pertanyaan berikut.
+def _og_prompt(query: str) -> str:
+    return f"""Anda adalah chatbot AI yang ramah dan membantu bernama Nara. Jawab pertanyaan berikut.
 Jawab secara akurat dan informatif dalam bahasa Indonesia.
 
 Pertanyaan:
 {query}
 """
-        response = model.generate_content(prompt)
-        return getattr(response, "text", "").strip() or "(Tidak ada teks balasan.)"
+
+def ask_rag_ai(query: str, top_k: int = 5) -> str:
+    try:
+        context = search_docs(query, top_k=top_k)
+        return _generate_text(_rag_prompt(query, context)).strip() or "(Tidak ada teks balasan.)"
+    except CassetteMiss:
+        raise
+    except Exception as e:
+        return f"Error during RAG AI call: {e}"
+
+def ask_og_ai(query: str) -> str:
+    try:
+        return _generate_text(_og_prompt(query)).strip() or "(Tidak ada teks balasan.)"
+    except CassetteMiss:
+        raise
     except Exception as e:
         return f"Error during Original AI call: {e}"
 
@@ -106,22 +206,16 @@ def _call_gemini_with_retry(prompt: str, retries: int = 3, backoff: float = 2.0)
     last_err = None
     for i in range(retries):
         try:
-            resp = model.generate_content(prompt)
-            return getattr(resp, "text", "")
+            return _generate_text(prompt)
+        except CassetteMiss:
+            raise
         except Exception as e:
             last_err = e
             time.sleep(backoff ** i)
     raise RuntimeError(f"Gagal memanggil Gemini setelah {retries} kali: {last_err}")
 
-def judge_with_ai(question: str, expected: str, answer: str) -> Dict[str, str | float]:
-    """
-    Menilai apakah 'answer' sesuai 'expected' untuk 'question'.
-    Return: dict {verdict, score, reason}
-    """
-    if not expected:
-        return {"verdict": "TIDAK PASTI", "score": 0.0, "reason": "Tidak ada jawaban acuan (gold) di CSV."}
-
-    prompt = f"""
+def _judge_prompt(question: str, expected: str, answer: str) -> str:
+    return f"""
 Anda adalah evaluator obyektif. Tugas Anda: nilai apakah JAWABAN_KANDIDAT setara secara semantik dengan JAWABAN_ACUAN untuk PERTANYAAN.
 
 KELUARAN HARUS JSON SAJA:
@@ -146,24 +240,105 @@ JAWABAN_ACUAN:
 JAWABAN_KANDIDAT:
 {answer}
 """
+
+def _judge_batch_prompt(items: List[Tuple[str, str, str]]) -> str:
+    """Satu prompt untuk banyak (question, expected, answer); kandidat dengan pertanyaan sama dikelompokkan."""
+    groups: Dict[Tuple[str, str], List[int]] = {}
+    for i, (question, expected, _) in enumerate(items):
+        groups.setdefault((question, expected), []).append(i)
+    blocks = []
+    for n, ((question, expected), ids) in enumerate(groups.items(), start=1):
+        candidates = "\n".join(f"JAWABAN_KANDIDAT id={i}:\n{items[i][2]}\n" for i in ids)
+        blocks.append(f"### PERTANYAAN {n}:\n{question}\n\nJAWABAN_ACUAN:\n{expected}\n\n{candidates}")
+    joined = "\n".join(blocks)
+    return f"""
+Anda adalah evaluator obyektif. Untuk SETIAP JAWABAN_KANDIDAT di bawah, nilai apakah jawaban itu setara secara semantik dengan JAWABAN_ACUAN untuk PERTANYAAN-nya. Nilai setiap kandidat secara terpisah.
+
+KELUARAN HARUS ARRAY JSON SAJA, satu objek per kandidat (total {len(items)}), dengan id yang sama:
+[
+  {{"id": 0, "verdict": "BENAR|SALAH|TIDAK PASTI", "score": 0.0, "reason": "alasan singkat <= 30 kata"}}
+]
+
+Aturan:
+- BENAR jika makna utama setara (sinonim/paraferase ok).
+- SALAH jika bertentangan/tidak menjawab/fakta inti hilang.
+- TIDAK PASTI jika sebagian benar/ambigu.
+- score antara 0.0 dan 1.0.
+- Balas HANYA array JSON.
+
+{joined}
+"""
+
+def _validate_judgement(data) -> Optional[Dict[str, str | float]]:
+    """Satu item dari balasan judge batch; None bila tidak sesuai skema."""
+    if not isinstance(data, dict):
+        return None
+    verdict = str(data.get("verdict", "")).strip().upper()
+    if verdict not in ("BENAR", "SALAH", "TIDAK PASTI"):
+        return None
+    try:
+        score = float(data["score"])
+    except (KeyError, TypeError, ValueError):
+        return None
+    if not 0.0 <= score <= 1.0:
+        return None
+    reason = str(data.get("reason", "")).strip()
+    return {"verdict": verdict, "score": round(score, 3), "reason": reason or "(tidak ada alasan)"}
+
+def _parse_judgement_batch(raw: str, n_items: int) -> List[Optional[Dict[str, str | float]]]:
+    """Hasil per item sesuai id; item yang hilang/tidak valid -> None (dinilai ulang satu per satu)."""
+    results: List[Optional[Dict]] = [None] * n_items
+    start = raw.find("["); end = raw.rfind("]")
+    try:
+        data = json.loads(raw[start:end+1] if start != -1 and end != -1 else raw)
+    except ValueError:
+        return results
+    if not isinstance(data, list):
+        return results
+    for entry in data:
+        if not isinstance(entry, dict):
+            continue
+        try:
+            i = int(entry.get("id"))
+        except (TypeError, ValueError):
+            continue
+        if 0 <= i < n_items and results[i] is None:
+            results[i] = _validate_judgement(entry)
+    return results
+
+def _heuristic_verdict(expected: str, answer: str, reason: str) -> Dict[str, str | float]:
+    score = _heuristic_score(expected, answer)
+    verdict = "BENAR" if score >= 0.8 else ("TIDAK PASTI" if score >= 0.6 else "SALAH")
+    return {"verdict": verdict, "score": round(score, 3), "reason": reason}
+
+def _parse_judgement(raw: str, expected: str, answer: str) -> Dict[str, str | float]:
+    """Ubah balasan judge (JSON) menjadi {verdict, score, reason}; gagal parse -> exception."""
+    start = raw.find("{"); end = raw.rfind("}")
+    raw_json = raw[start:end+1] if start != -1 and end != -1 else raw
+    data = json.loads(raw_json)
+    verdict = str(data.get("verdict", "")).upper()
+    score = float(data.get("score", 0.0))
+    reason = str(data.get("reason", "")).strip()
+    if verdict not in ("BENAR", "SALAH", "TIDAK PASTI"):
+        score_h = _heuristic_score(expected, answer)
+        verdict = "BENAR" if score_h >= 0.8 else ("TIDAK PASTI" if score_h >= 0.6 else "SALAH")
+        reason = reason or "Fallback heuristik kemiripan."
+        score = score or score_h
+    return {"verdict": verdict, "score": round(score, 3), "reason": reason or "(tidak ada alasan)"}
+
+def judge_with_ai(question: str, expected: str, answer: str) -> Dict[str, str | float]:
+    """
+    Menilai apakah 'answer' sesuai 'expected' untuk 'question'.
+    Return: dict {verdict, score, reason}
+    """
+    if not expected:
+        return {"verdict": "TIDAK PASTI", "score": 0.0, "reason": "Tidak ada jawaban acuan (gold) di CSV."}
     try:
-        raw = _call_gemini_with_retry(prompt)
-        start = raw.find("{"); end = raw.rfind("}")
-        raw_json = raw[start:end+1] if start != -1 and end != -1 else raw
-        data = json.loads(raw_json)
-        verdict = str(data.get("verdict", "")).upper()
-        score = float(data.get("score", 0.0))
-        reason = str(data.get("reason", "")).strip()
-        if verdict not in ("BENAR", "SALAH", "TIDAK PASTI"):
-            score_h = _heuristic_score(expected, answer)
-            verdict = "BENAR" if score_h >= 0.8 else ("TIDAK PASTI" if score_h >= 0.6 else "SALAH")
-            reason = reason or "Fallback heuristik kemiripan."
-            score = score or score_h
-        return {"verdict": verdict, "score": round(score, 3), "reason": reason or "(tidak ada alasan)"}
+        return _parse_judgement(_call_gemini_with_retry(_judge_prompt(question, expected, answer)), expected, answer)
+    except CassetteMiss:
+        raise
     except Exception:
-        score = _heuristic_score(expected, answer)
-        verdict = "BENAR" if score >= 0.8 else ("TIDAK PASTI" if score >= 0.6 else "SALAH")
-        return {"verdict": verdict, "score": round(score, 3), "reason": "Fallback heuristik (LLM judge gagal)."}
+        return _heuristic_verdict(expected, answer, "Fallback heuristik (LLM judge gagal).")
 
 # ======================================================================
 # Utilitas CSV
@@ -200,91 +375,393 @@ def _read_testcases(path: str) -> List[Dict[str, str]]:
                     cases.append({"q": q, "gold": ""})
     return cases
 
-def _open_output_csv(base_dir: str) -> tuple[csv.DictWriter, any, str]:
+OUTPUT_FIELDNAMES = [
+    "pertanyaan", "expected",
+    "ragAI", "rag_benar", "rag_score", "rag_verdict", "rag_reason",
+    "ogAI",  "og_benar",  "og_score",  "og_verdict",  "og_reason",
+]
+
+def question_key(question: str) -> str:
+    """Hash pertanyaan (spasi dinormalisasi) untuk mencocokkan baris yang sudah selesai."""
+    return hashlib.sha256(" ".join(question.split()).encode("utf-8")).hexdigest()[:16]
+
+class _RowAppender:
+    """
+    Tulis baris CSV secara append. Setiap baris dikirim dengan satu write()
+    lalu fsync, jadi proses yang dibunuh tidak meninggalkan baris setengah jadi.
+    """
+
+    def __init__(self, path: str, fieldnames: List[str]):
+        self.path = path
+        self.fieldnames = fieldnames
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        self._fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        if new_file:
+            self._write(lambda w: w.writeheader())
+
+    def _write(self, fn):
+        buf = io.StringIO()
+        fn(csv.DictWriter(buf, fieldnames=self.fieldnames))
+        os.write(self._fd, buf.getvalue().encode("utf-8"))
+        os.fsync(self._fd)
+
+    def writerow(self, row: Dict):
+        self._write(lambda w: w.writerow(row))
+
+    def close(self):
+        os.close(self._fd)
+
+def _open_output_csv(base_dir: str) -> tuple[_RowAppender, str]:
     Path(base_dir).mkdir(parents=True, exist_ok=True)
     ts = datetime.now(ZoneInfo("Asia/Jakarta")).strftime("%Y%m%d-%H%M%S")
     output_path = os.path.join(base_dir, f"test-{ts}.csv")
-    f = open(output_path, "w", newline="", encoding="utf-8")
-    fieldnames = [
-        "pertanyaan", "expected",
-        "ragAI", "rag_benar", "rag_score", "rag_verdict", "rag_reason",
-        "ogAI",  "og_benar",  "og_score",  "og_verdict",  "og_reason",
-    ]
-    writer = csv.DictWriter(f, fieldnames=fieldnames)
-    writer.writeheader()
-    return writer, f, output_path
+    return _RowAppender(output_path, OUTPUT_FIELDNAMES), output_path
+
+def _load_completed(output_path: str) -> Counter:
+    """
+    Hitung pertanyaan yang sudah ada di output run sebelumnya (per hash).
+    Baris terakhir yang terpotong (file lama / tulisan yang tidak selesai)
+    dibuang dengan menulis ulang file secara atomik.
+    """
+    with open(output_path, newline="", encoding="utf-8") as f:
+        raw = f.read()
+    records = list(csv.reader(io.StringIO(raw)))
+    if not records:
+        return Counter()
+    header, rows = records[0], records[1:]
+    if header != OUTPUT_FIELDNAMES:
+        raise ValueError(f"Kolom '{output_path}' tidak cocok dengan format output tester.")
+    if rows and (len(rows[-1]) != len(header) or not raw.endswith("\n")):
+        print(f"Baris terakhir di {output_path} terpotong; dibuang dan akan diproses ulang.")
+        rows = rows[:-1]
+        _replace_rows(output_path, header, rows)
+    return Counter(question_key(row[0]) for row in rows)
+
+def _replace_rows(output_path: str, header: List[str], rows: List[List[str]]) -> None:
+    """Tulis ulang file output secara atomik (tmp + os.replace)."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(header)
+    writer.writerows(rows)
+    with open(output_path + ".tmp", "w", newline="", encoding="utf-8") as f:
+        f.write(buf.getvalue())
+    os.replace(output_path + ".tmp", output_path)
+
+def _reorder_output(output_path: str, cases: List[Dict[str, str]]) -> None:
+    """
+    Urutkan ulang output hasil resume sesuai urutan `cases` (analisis
+    membandingkan run per posisi baris). Baris yang muncul lebih sering dari
+    pertanyaannya di input dibuang; baris yang tidak ada di input ditaruh di akhir.
+    """
+    with open(output_path, newline="", encoding="utf-8") as f:
+        records = list(csv.reader(f))
+    header, rows = records[0], records[1:]
+    by_key: Dict[str, List[List[str]]] = {}
+    for row in rows:
+        by_key.setdefault(question_key(row[0]), []).append(row)
+    ordered = []
+    for case in cases:
+        matches = by_key.get(question_key(case["q"]))
+        if matches:
+            ordered.append(matches.pop(0))
+    input_keys = {question_key(c["q"]) for c in cases}
+    extra = [row for key, left in by_key.items() if key not in input_keys for row in left]
+    dropped = len(rows) - len(ordered) - len(extra)
+    _replace_rows(output_path, header, ordered + extra)
+    if dropped:
+        print(f"{dropped} baris duplikat dibuang dari {output_path}.")
 
 # ======================================================================
-# Mode batch (dengan jeda per N pertanyaan) & interaktif
+# Mode batch (async, dijadwalkan sesuai kuota) & interaktif
 # ======================================================================
 
-def _cooldown(seconds: int):
-    """Jeda dengan countdown agar terlihat progresnya."""
-    if seconds <= 0:
+async def _generate_async(limiter: AsyncQuotaLimiter, prompt: str) -> str:
+    """
+    generate_content_async lewat cassette (bila aktif) dan limiter kuota.
+    Respons hasil replay tidak memakai kuota.
+    """
+    if cassette is None:
+        return await _generate_live_async(limiter, prompt)
+    return await cassette.call_async(
+        "generate", {"model": GENERATIVE_MODEL, "prompt": prompt},
+        lambda: _generate_live_async(limiter, prompt),
+    )
+
+async def _generate_live_async(limiter: AsyncQuotaLimiter, prompt: str) -> str:
+    """generate_content_async lewat limiter kuota; 429 menahan semua panggilan lalu dicoba ulang."""
+    tokens = count_tokens(prompt) + EVAL_OUTPUT_TOKENS
+    for attempt in range(EVAL_MAX_RETRIES + 1):
+        await limiter.acquire(tokens)
+        try:
+            resp = await model.generate_content_async(prompt)
+            return getattr(resp, "text", "")
+        except Exception as e:
+            if attempt == EVAL_MAX_RETRIES:
+                raise
+            if is_rate_limited(e):
+                limiter.penalize(retry_delay(e, default=min(60.0, 2.0 ** (attempt + 2))))
+            else:
+                await asyncio.sleep(2.0 ** attempt)
+
+async def ask_rag_ai_async(limiter: AsyncQuotaLimiter, query: str, top_k: int = 5,
+                           context: Optional[List[str]] = None) -> str:
+    """`context` hasil prefetch (_search_docs_batch); None = cari sendiri lewat search_docs."""
+    try:
+        if context is None:
+            context = await asyncio.to_thread(search_docs, query, top_k)
+        return (await _generate_async(limiter, _rag_prompt(query, context))).strip() or "(Tidak ada teks balasan.)"
+    except CassetteMiss:
+        raise
+    except Exception as e:
+        return f"Error during RAG AI call: {e}"
+
+async def ask_og_ai_async(limiter: AsyncQuotaLimiter, query: str) -> str:
+    try:
+        return (await _generate_async(limiter, _og_prompt(query))).strip() or "(Tidak ada teks balasan.)"
+    except CassetteMiss:
+        raise
+    except Exception as e:
+        return f"Error during Original AI call: {e}"
+
+async def judge_with_ai_async(limiter: AsyncQuotaLimiter, question: str, expected: str, answer: str) -> Dict[str, str | float]:
+    if not expected:
+        return {"verdict": "TIDAK PASTI", "score": 0.0, "reason": "CSV tidak menyediakan expected."}
+    try:
+        raw = await _generate_async(limiter, _judge_prompt(question, expected, answer))
+        return _parse_judgement(raw, expected, answer)
+    except CassetteMiss:
+        raise
+    except Exception:
+        return _heuristic_verdict(expected, answer, "Fallback heuristik (LLM judge gagal).")
+
+class _JudgeBatcher:
+    """
+    Nilai jawaban RAG & OG dari beberapa pertanyaan berurutan dalam satu
+    prompt judge. Kelompoknya tetap (indeks pertanyaan // jumlah pertanyaan
+    per batch, RAG lalu OG), jadi prompt yang sama terbentuk di setiap run dan
+    bisa diputar ulang dari cassette. Batch dikirim begitu semua pertanyaan
+    di kelompoknya selesai dijawab; item yang gagal divalidasi dinilai ulang
+    satu per satu.
+    """
+
+    def __init__(self, limiter: AsyncQuotaLimiter, cases: List[Dict], batch_size: int):
+        self.limiter = limiter
+        self.questions_per_batch = max(1, batch_size // 2)
+        # Setiap pertanyaan menyumbang dua jawaban (RAG & OG); 1 = judge satu per prompt
+        self.batch_size = 1 if batch_size <= 1 else 2 * self.questions_per_batch
+        # Jumlah pertanyaan (yang punya expected) per kelompok
+        self._expected = Counter(i // self.questions_per_batch for i, c in enumerate(cases) if c.get("gold"))
+        self._groups: Dict[int, Dict[int, Tuple[List[Tuple[str, str, str]], List[asyncio.Future]]]] = {}
+        self.items = 0
+        self.calls = 0
+        self.fallbacks = 0
+
+    async def judge_case(self, index: int, question: str, expected: str, answers: List[str]) -> List[Dict]:
+        """Nilai semua `answers` untuk pertanyaan ke-`index`."""
+        if not expected or self.batch_size == 1:
+            if expected:
+                self.items += len(answers)
+                self.calls += len(answers)
+            return list(await asyncio.gather(
+                *(judge_with_ai_async(self.limiter, question, expected, a) for a in answers)
+            ))
+        loop = asyncio.get_running_loop()
+        futures = [loop.create_future() for _ in answers]
+        group_id = index // self.questions_per_batch
+        group = self._groups.setdefault(group_id, {})
+        group[index] = ([(question, expected, a) for a in answers], futures)
+        if len(group) == self._expected[group_id]:
+            del self._groups[group_id]
+            entries = [group[i] for i in sorted(group)]
+            await self._run(
+                [item for items, _ in entries for item in items],
+                [future for _, fs in entries for future in fs],
+            )
+        return list(await asyncio.gather(*futures))
+
+    async def _run(self, items: List[Tuple[str, str, str]], futures: List[asyncio.Future]) -> None:
+        try:
+            self.items += len(items)
+            parsed: List[Optional[Dict]] = [None] * len(items)
+            if len(items) > 1:
+                self.calls += 1
+                try:
+                    raw = await _generate_async(self.limiter, _judge_batch_prompt(items))
+                    parsed = _parse_judgement_batch(raw, len(items))
+                except CassetteMiss:
+                    raise
+                except Exception:
+                    pass
+
+            async def resolve(item, result):
+                if result is None:
+                    self.fallbacks += 1
+                    self.calls += 1
+                    result = await judge_with_ai_async(self.limiter, *item)
+                return result
+
+            results = await asyncio.gather(*(resolve(item, result) for item, result in zip(items, parsed)))
+            for future, result in zip(futures, results):
+                future.set_result(result)
+        except BaseException as e:
+            # Pertanyaan lain di kelompok ini ikut gagal, bukan menunggu selamanya
+            for future in futures:
+                if not future.done():
+                    future.set_exception(e)
+            raise
+
+def _build_row(q: str, gold: str, rag_answer: str, og_answer: str,
+               rag_eval: Dict, og_eval: Dict, threshold: float) -> Dict[str, str | float]:
+    rag_benar = "TRUE" if (rag_eval["verdict"] == "BENAR" or float(rag_eval["score"]) >= threshold) else "FALSE"
+    og_benar  = "TRUE" if (og_eval["verdict"]  == "BENAR" or float(og_eval["score"])  >= threshold) else "FALSE"
+    return {
+        "pertanyaan": q, "expected": gold,
+        "ragAI": rag_answer,
+        "rag_benar": rag_benar, "rag_score": rag_eval["score"],
+        "rag_verdict": rag_eval["verdict"], "rag_reason": rag_eval["reason"],
+        "ogAI": og_answer,
+        "og_benar": og_benar, "og_score": og_eval["score"],
+        "og_verdict": og_eval["verdict"], "og_reason": og_eval["reason"],
+    }
+
+async def _evaluate_case(limiter: AsyncQuotaLimiter, judge: _JudgeBatcher, semaphore: asyncio.Semaphore,
+                         index: int, case: Dict[str, str], top_k: int, threshold: float) -> Dict:
+    q = case["q"]; gold = case.get("gold", "")
+    # Slot konkurensi hanya untuk menjawab; menunggu kelompok judge tidak menahan pertanyaan lain
+    async with semaphore:
+        rag_answer, og_answer = await asyncio.gather(
+            ask_rag_ai_async(limiter, q, top_k=top_k, context=case.get("context")),
+            ask_og_ai_async(limiter, q),
+        )
+    rag_eval, og_eval = await judge.judge_case(index, q, gold, [rag_answer, og_answer])
+    return _build_row(q, gold, rag_answer, og_answer, rag_eval, og_eval, threshold)
+
+async def _prefetch_contexts(cases: List[Dict], top_k: int) -> None:
+    """
+    Ambil konteks RAG semua pertanyaan sebelum generasi dimulai lewat
+    rag.search.search_docs_batch (embedding batch + satu search_batch). Bila
+    gagal, setiap pertanyaan mencari sendiri saat dijawab.
+    """
+    if not cases:
         return
-    print(f"Cooldown {seconds} detik untuk menghormati kuota/rate limit...")
-    for remaining in range(seconds, 0, -1):
-        print(f"\rIstirahat: {remaining:02d}s ", end="", flush=True)
-        time.sleep(1)
-    print("\rLanjut...         ")
+    started = time.perf_counter()
+    try:
+        contexts = await asyncio.to_thread(_search_docs_batch, [c["q"] for c in cases], top_k)
+    except CassetteMiss:
+        raise
+    except Exception as e:
+        print(f"⚠️ Prefetch konteks gagal ({e}); retrieval dilakukan per pertanyaan.")
+        return
+    for case, context in zip(cases, contexts):
+        case["context"] = context
+    print(f"Konteks {len(cases)} pertanyaan diambil dalam {time.perf_counter() - started:.1f} detik.")
 
-def run_batch_from_csv(
+async def run_batch_async(
     input_csv_path: str,
     output_dir: str = "test",
     top_k: int = 5,
     threshold: float = 0.7,
-    batch_size: int = 5,
-    cooldown_seconds: int = 70,
+    rpm: float = EVAL_RPM,
+    tpm: float = EVAL_TPM,
+    concurrency: int = EVAL_CONCURRENCY,
+    resume_path: Optional[str] = None,
+    judge_batch: int = EVAL_JUDGE_BATCH,
 ) -> str:
+    """
+    Evaluasi semua pertanyaan secara konkuren: jawaban RAG & OG paralel, lalu
+    kedua jawaban dinilai. Penilaian dari beberapa pertanyaan digabung menjadi
+    satu prompt judge (`judge_batch` kandidat per prompt). Laju panggilan
+    Gemini diatur AsyncQuotaLimiter (RPM/TPM) sehingga tidak perlu jeda tetap
+    antar batch.
+
+    Dengan `resume_path`, pertanyaan yang sudah ada di file output tersebut
+    dilewati dan hanya yang belum selesai ditambahkan ke file yang sama;
+    setelah selesai file diurutkan ulang sesuai urutan input.
+    """
     cases = _read_testcases(input_csv_path)
     if not cases:
         raise ValueError(f"Tidak ada baris terbaca dari '{input_csv_path}'.")
-
-    writer, fh, output_path = _open_output_csv(output_dir)
-    try:
-        total = len(cases)
-        print(f"Menjalankan batch untuk {total} pertanyaan...")
-        for i, case in enumerate(cases, start=1):
-            q = case["q"]; gold = case.get("gold", "")
-            print(f"[{i}/{total}] Memproses: {q[:80]}{'...' if len(q) > 80 else ''}")
-
-            rag_answer = ask_rag_ai(q, top_k=top_k)
-            og_answer  = ask_og_ai(q)
-
-            if gold:
-                rag_eval = judge_with_ai(q, gold, rag_answer)
-                og_eval  = judge_with_ai(q, gold, og_answer)
+    all_cases = cases
+
+    if resume_path:
+        completed = _load_completed(resume_path)
+        skipped = sum(completed.values())
+        pending = []
+        for case in cases:
+            key = question_key(case["q"])
+            if completed[key] > 0:
+                completed[key] -= 1
             else:
-                rag_eval = {"verdict": "TIDAK PASTI", "score": 0.0, "reason": "CSV tidak menyediakan expected."}
-                og_eval  = {"verdict": "TIDAK PASTI", "score": 0.0, "reason": "CSV tidak menyediakan expected."}
-
-            rag_benar = "TRUE" if (rag_eval["verdict"] == "BENAR" or float(rag_eval["score"]) >= threshold) else "FALSE"
-            og_benar  = "TRUE" if (og_eval["verdict"]  == "BENAR" or float(og_eval["score"])  >= threshold) else "FALSE"
-
-            writer.writerow({
-                "pertanyaan": q, "expected": gold,
-                "ragAI": rag_answer,
-                "rag_benar": rag_benar, "rag_score": rag_eval["score"],
-                "rag_verdict": rag_eval["verdict"], "rag_reason": rag_eval["reason"],
-                "ogAI": og_answer,
-                "og_benar": og_benar, "og_score": og_eval["score"],
-                "og_verdict": og_eval["verdict"], "og_reason": og_eval["reason"],
-            })
-
-            # --- jeda setiap 'batch_size' pertanyaan, kecuali di akhir ---
-            if (i % batch_size == 0) and (i < total):
-                # pastikan data tersimpan
-                fh.flush()
-                try:
-                    os.fsync(fh.fileno())
-                except Exception:
-                    pass
-                _cooldown(cooldown_seconds)
+                pending.append(case)
+        print(f"Melanjutkan {resume_path}: {len(cases) - len(pending)} pertanyaan sudah selesai, "
+              f"{len(pending)} tersisa.")
+        if skipped > len(cases) - len(pending):
+            print(f"Catatan: {skipped - (len(cases) - len(pending))} baris di output tidak ada di '{input_csv_path}'.")
+        cases = pending
+        writer, output_path = _RowAppender(resume_path, OUTPUT_FIELDNAMES), resume_path
+    else:
+        writer, output_path = _open_output_csv(output_dir)
 
-        print(f"Selesai. Hasil disimpan ke {output_path}")
-        return output_path
+    await _prefetch_contexts(cases, top_k)
+    limiter = AsyncQuotaLimiter(rpm=rpm, tpm=tpm)
+    judge = _JudgeBatcher(limiter, cases, judge_batch)
+    semaphore = asyncio.Semaphore(concurrency)
+    total = len(cases)
+    done = 0
+    started = time.perf_counter()
+
+    async def worker(index, case):
+        return index, await _evaluate_case(limiter, judge, semaphore, index, case, top_k, threshold)
+
+    # Baris ditulis sesuai urutan input (analisis membandingkan run per posisi baris);
+    # hasil yang selesai lebih awal ditahan sampai semua baris sebelumnya tertulis
+    finished: Dict[int, Dict] = {}
+    next_index = 0
+
+    try:
+        print(f"Menjalankan batch untuk {total} pertanyaan (RPM {rpm:g}, TPM {tpm:g}, {concurrency} paralel, "
+              f"{judge.batch_size} jawaban per judge)...")
+        for future in asyncio.as_completed([worker(i, c) for i, c in enumerate(cases)]):
+            index, row = await future
+            finished[index] = row
+            while next_index in finished:
+                writer.writerow(finished.pop(next_index))
+                next_index += 1
+            done += 1
+            q = row["pertanyaan"]
+            print(f"[{done}/{total}] Selesai: {q[:80]}{'...' if len(q) > 80 else ''}")
     finally:
-        fh.close()
+        writer.close()
+
+    if resume_path:
+        _reorder_output(output_path, all_cases)
+    elapsed = time.perf_counter() - started
+    print(f"Selesai dalam {elapsed:.0f} detik ({limiter.throttled} kali 429, "
+          f"{limiter.waited_seconds:.0f} detik menunggu kuota). Hasil disimpan ke {output_path}")
+    print(f"Judge: {judge.calls} panggilan untuk {judge.items} jawaban "
+          f"({judge.fallbacks} dinilai ulang satu per satu)")
+    if cassette is not None:
+        stats = cassette.stats()
+        print(f"Cassette {cassette.path} ({stats['mode']}): {stats['recorded']} direkam, "
+              f"{stats['replayed']} diputar ulang")
+    return output_path
+
+def run_batch_from_csv(
+    input_csv_path: str,
+    output_dir: str = "test",
+    top_k: int = 5,
+    threshold: float = 0.7,
+    rpm: float = EVAL_RPM,
+    tpm: float = EVAL_TPM,
+    concurrency: int = EVAL_CONCURRENCY,
+    resume_path: Optional[str] = None,
+    judge_batch: int = EVAL_JUDGE_BATCH,
+) -> str:
+    return asyncio.run(run_batch_async(
+        input_csv_path, output_dir=output_dir, top_k=top_k, threshold=threshold,
+        rpm=rpm, tpm=tpm, concurrency=concurrency, resume_path=resume_path,
+        judge_batch=judge_batch,
+    ))
 
 def run_interactive():
     """
@@ -320,23 +797,37 @@ def run_interactive():
 
 if __name__ == "__main__":
     import argparse
-    parser = argparse.ArgumentParser(description="Tester RAG vs OG + AI Judge + Batching Delay")
+    parser = argparse.ArgumentParser(description="Tester RAG vs OG + AI Judge (batch konkuren sesuai kuota)")
     parser.add_argument("--batch-csv", help="Path ke file CSV berisi pertanyaan (mis. test.csv)")
     parser.add_argument("--output-dir", default="test", help="Folder output hasil batch (default: test)")
     parser.add_argument("--top-k", type=int, default=5, help="Jumlah dokumen RAG dari Qdrant (default: 5)")
     parser.add_argument("--threshold", type=float, default=0.7, help="Ambang skor untuk TRUE/FALSE (default: 0.7)")
-    parser.add_argument("--batch-size", type=int, default=5, help="Jumlah pertanyaan per batch sebelum jeda (default: 5)")
-    parser.add_argument("--cooldown", type=int, default=70, help="Durasi jeda dalam detik setiap selesai satu batch (default: 70)")
+    parser.add_argument("--rpm", type=float, default=EVAL_RPM, help=f"Batas request Gemini per menit (default: {EVAL_RPM:g})")
+    parser.add_argument("--tpm", type=float, default=EVAL_TPM, help=f"Batas token Gemini per menit (default: {EVAL_TPM:g})")
+    parser.add_argument("--concurrency", type=int, default=EVAL_CONCURRENCY, help=f"Jumlah pertanyaan diproses bersamaan (default: {EVAL_CONCURRENCY})")
+    parser.add_argument("--resume", metavar="OUTPUT_CSV", help="Lanjutkan run yang terputus: lewati pertanyaan yang sudah ada di file output ini")
+    parser.add_argument("--judge-batch", type=int, default=EVAL_JUDGE_BATCH, help=f"Jawaban yang dinilai per prompt judge, 1 = satu per prompt (default: {EVAL_JUDGE_BATCH})")
+    parser.add_argument("--cassette", metavar="PATH", default=os.getenv("EVAL_CASSETTE", ""),
+                        help="File cassette untuk merekam/memutar ulang panggilan Gemini & Qdrant")
+    parser.add_argument("--cassette-mode", choices=CASSETTE_MODES, default=os.getenv("EVAL_CASSETTE_MODE", "auto"),
+                        help="record | replay (tanpa jaringan) | auto (replay bila ada, selain itu record) | off")
+    parser.add_argument("--replay-latency", type=float, default=float(os.getenv("EVAL_REPLAY_LATENCY", "0")),
+                        help="Skala latensi rekaman saat replay (0 = tanpa jeda, 1 = seperti aslinya)")
     args = parser.parse_args()
 
+    cassette = open_cassette(args.cassette, args.cassette_mode, args.replay_latency)
+
     if args.batch_csv:
         out_path = run_batch_from_csv(
             args.batch_csv,
             output_dir=args.output_dir,
             top_k=args.top_k,
             threshold=args.threshold,
-            batch_size=args.batch_size,
-            cooldown_seconds=args.cooldown,
+            rpm=args.rpm,
+            tpm=args.tpm,
+            concurrency=args.concurrency,
+            resume_path=args.resume,
+            judge_batch=args.judge_batch,
         )
         print(f"Output: {out_path}")
     else: